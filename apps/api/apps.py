@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    name = 'apps.api'
+
+    def ready(self):
+        from . import cache  # noqa: F401  (connects invalidation signals)
+        from . import sync  # noqa: F401  (connects tombstone signals)
+        from . import instrumentation  # noqa: F401  (instruments database connections)
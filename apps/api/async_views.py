@@ -0,0 +1,183 @@
+"""
+Async (ASGI) list, retrieve and create for the patient and record viewsets.
+
+AsyncViewSetMixin gives a viewset ``alist``, ``aretrieve`` and ``acreate``,
+the async twins of DRF's actions: rows are read with Django's async ORM,
+and the viewset's mixins (audit, response cache, conditional GET, fast
+list) contribute async versions of their steps. With API_ASYNC_VIEWS,
+apps.api.urls routes the list and detail URLs to ``as_async_view()``.
+Served under ASGI (e.g. ``uvicorn meditrakapi.asgi:application``), those
+requests run on the event loop together with the async tenant and
+instrumentation middlewares. Under WSGI Django would run every async view
+in its own event loop, so leave the setting off there.
+
+What the async views do not cover is handed to the regular view in a
+thread, with the same result: other actions (update, destroy), renderers
+other than JSON (the browsable API) and requests without a tenant.
+DRF validators are synchronous, so ``acreate`` validates in a thread and
+inserts with the async ORM.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .instrumentation import phase
+
+
+async def asave(serializer, **kwargs):
+    """
+    ``serializer.save(**kwargs)`` for creating with a ModelSerializer
+    without many-to-many fields, inserting with the async ORM.
+    """
+    validated_data = {**serializer.validated_data, **kwargs}
+    model = serializer.Meta.model
+    serializer.instance = await model._default_manager.acreate(**validated_data)
+    return serializer.instance
+
+
+def rendered(response):
+    """
+    Renders a DRF Response into a plain HttpResponse: Django renders
+    template responses of async views in a thread.
+    """
+    if not hasattr(response, 'render'):
+        return response
+    with phase('render'):
+        response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    return plain
+
+
+class AsyncViewSetMixin:
+    async_actions = ('list', 'retrieve', 'create')
+
+    @classmethod
+    def as_async_view(cls, actions, **initkwargs):
+        """
+        Async counterpart of ``as_view(actions, **initkwargs)``: serves
+        ``async_actions`` with ``adispatch`` and the rest with the view
+        ``as_view`` returns.
+        """
+        actions = dict(actions)
+        if 'get' in actions:
+            actions.setdefault('head', actions['get'])
+        sync_view = cls.as_view(actions, **initkwargs)
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            response = await self.adispatch(request, *args, **kwargs)
+            if response is None:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return response
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True
+        view.login_required = False
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch for ``async_actions``; None to use the regular view."""
+        if getattr(request, 'tenant', None) is None:
+            return None
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        if self.action not in self.async_actions:
+            return None
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        try:
+            renderer, _ = self.perform_content_negotiation(request)
+        except NotAcceptable:
+            return None
+        if not isinstance(renderer, JSONRenderer):
+            return None
+        self.headers = self.default_response_headers
+
+        try:
+            self.initial(request, *args, **kwargs)
+            response = await getattr(self, f'a{self.action}')(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return rendered(self.response)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def acreate(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        # Unique and related field validators query the database.
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await self.aperform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    async def aperform_create(self, serializer):
+        await asave(serializer)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        # Same errors as rest_framework.generics.get_object_or_404.
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+def async_urlpatterns(urlpatterns):
+    """
+    Router URL patterns with the views of AsyncViewSetMixin viewsets that
+    have an async action replaced by their ``as_async_view()``.
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        callback = pattern.callback
+        cls = getattr(callback, 'cls', None)
+        actions = getattr(callback, 'actions', None) or {}
+        if (
+            cls is not None and issubclass(cls, AsyncViewSetMixin)
+            and set(actions.values()) & set(cls.async_actions)
+        ):
+            view = cls.as_async_view(actions, **callback.initkwargs)
+            pattern = URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,234 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .sinks import DatabaseSink
+
+logger = logging.getLogger(__name__)
+
+BLOCK = "block"
+DROP = "drop"
+SYNC = "sync"
+BACKPRESSURE_POLICIES = (BLOCK, DROP, SYNC)
+
+DEFAULTS = {
+    "ASYNC": True,
+    "BATCH_SIZE": 100,
+    "FLUSH_INTERVAL": 1.0,
+    "QUEUE_SIZE": 10000,
+    "BACKPRESSURE": BLOCK,
+    "BLOCK_TIMEOUT": 0.5,
+    "SINK": "apps.api.sinks.DatabaseSink",
+    "SINK_OPTIONS": {},
+}
+
+_STOP = object()
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditLogWriter:
+    """
+    Buffers audit events in memory and hands them in batches to ``sink``
+    (apps.api.sinks, AuditLog rows by default) from a background thread.
+
+    A batch is written when it reaches ``batch_size`` events or when
+    ``flush_interval`` seconds have passed since the last write. When the
+    queue is full the ``backpressure`` policy decides what happens:
+
+    - ``block``: wait up to ``block_timeout`` seconds for room, then write
+      the event synchronously.
+    - ``drop``: discard the event and count it in ``dropped``.
+    - ``sync``: write the event synchronously on the caller's thread.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=1.0, queue_size=10000,
+                 backpressure=BLOCK, block_timeout=0.5, run_async=True, sink=None):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown audit backpressure policy: {backpressure}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.run_async = run_async
+        self.sink = sink if sink is not None else DatabaseSink()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's queue and thread are not ours.
+                self._reset()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, event):
+        """Queue one audit event (a dict of AuditLog field values)."""
+        if not self.run_async or self._closed:
+            self._write([event])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+            return
+        except queue.Full:
+            pass
+
+        if self.backpressure == DROP:
+            self.dropped += 1
+            logger.warning("Audit queue full, dropping event (%d dropped so far)", self.dropped)
+            return
+        if self.backpressure == BLOCK:
+            try:
+                self._queue.put(event, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        self._write([event])
+
+    async def asubmit(self, event):
+        """
+        submit for async code: queuing is done on the event loop, writing
+        synchronously (run_async off, full queue) in a thread.
+        """
+        if self.run_async and not self._closed:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                pass
+        await sync_to_async(self.submit)(event)
+
+    def flush(self, timeout=None):
+        """Block until every event queued before this call has been written."""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Stop the worker thread, writing anything still queued."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        self._thread = None
+        self.sink.close()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._drain(batch)
+                connections.close_all()
+                return
+            if isinstance(item, _FlushRequest):
+                self._write(batch)
+                batch = []
+                item.done.set()
+                continue
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    close_old_connections()
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _drain(self, batch):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def _write(self, events):
+        if not events:
+            return
+        try:
+            self.sink.write(events)
+        except Exception:
+            logger.exception("Failed to write %d audit events", len(events))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                conf = {**DEFAULTS, **getattr(settings, "AUDIT_LOG", {})}
+                _writer = AuditLogWriter(
+                    batch_size=conf["BATCH_SIZE"],
+                    flush_interval=conf["FLUSH_INTERVAL"],
+                    queue_size=conf["QUEUE_SIZE"],
+                    backpressure=conf["BACKPRESSURE"],
+                    block_timeout=conf["BLOCK_TIMEOUT"],
+                    run_async=conf["ASYNC"],
+                    sink=import_string(conf["SINK"])(**conf["SINK_OPTIONS"]),
+                )
+    return _writer
+
+
+@atexit.register
+def _close_writer():
+    if _writer is not None:
+        _writer.close()
+
+
+@receiver(setting_changed)
+def _reset_writer(*, setting, **kwargs):
+    global _writer
+    if setting == "AUDIT_LOG" and _writer is not None:
+        _writer.close()
+        _writer = None
@@ -0,0 +1,499 @@
+"""
+Benchmark data and load generator behind ``manage.py seed_benchmark`` and
+``manage.py loadtest``.
+
+seed() creates ``bench-<n>`` tenants cycling through rigid/flexible records
+and non-premium/premium, each with a ``bench-<n>`` user (password
+``bench``), patients and records. run_load() logs those users in and sends
+a weighted mix of requests to the JWT endpoints from several threads, either
+in process through django.test.Client (which also counts the queries of each
+request) or over HTTP against a running server, whose Server-Timing header
+gives the query count. summarize() turns the samples into p50/p95/p99
+latency, requests/s and queries per request.
+
+run_load_async() is the ASGI counterpart: the requests go through
+django.test.AsyncClient from tasks on one event loop, so with
+API_ASYNC_VIEWS the async views serve them concurrently.
+"""
+import asyncio
+import http.client
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, connections, transaction
+
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+
+PREFIX = 'bench-'
+PASSWORD = 'bench'
+TENANT_TYPES = ('hospital', 'clinic', 'mobile_app')
+DIAGNOSES = ('Flu', 'Migraine', 'Hypertension', 'Asthma', 'Fracture')
+SAMPLE_IDS = 200
+
+
+def make_data(rng):
+    kind = rng.choice(('Lab', 'Vitals', 'Imaging', 'Note'))
+    if kind == 'Lab':
+        data = {'test': rng.choice(('glucose', 'hba1c', 'ldl', 'tsh')), 'value': rng.randint(50, 200),
+                'fasting': rng.random() < 0.5}
+    elif kind == 'Vitals':
+        data = {'bpm': rng.randint(50, 120), 'spo2': rng.randint(90, 100)}
+        if rng.random() < 0.1:
+            data['device'] = rng.choice(('watch', 'oximeter'))
+    elif kind == 'Imaging':
+        data = {'modality': rng.choice(('xray', 'mri', 'ct')), 'region': rng.choice(('chest', 'knee'))}
+    else:
+        data = {'text': 'Follow-up in two weeks', 'author': f'dr-{rng.randint(1, 40)}'}
+    return kind, data
+
+
+def make_record(tenant, patient, rng):
+    if tenant.patient_records_type == Tenant.FLEXIBLE:
+        kind, data = make_data(rng)
+        return FlexibleRecord(patient=patient, tenant=tenant, record_type=kind, data=data)
+    return Record(
+        patient=patient, tenant=tenant, diagnosis=rng.choice(DIAGNOSES),
+        treatment='Rest and fluids', doctor_name=f'Dr. {rng.randint(1, 40)}',
+    )
+
+
+def clear():
+    """Deletes the benchmark tenants (and their data) and users."""
+    Tenant.objects.filter(name__startswith=PREFIX).delete()
+    User.objects.filter(username__startswith=PREFIX).delete()
+
+
+@transaction.atomic
+def seed(tenants, patients, records, rng, batch_size=5000):
+    """
+    Creates ``tenants`` tenants with ``patients`` patients and ``records``
+    records each. Tenant n is flexible when n is odd and premium when
+    n % 4 >= 2, so any four consecutive tenants cover every combination.
+    """
+    password = make_password(PASSWORD)
+    for number in range(tenants):
+        premium = number % 4 >= 2
+        tenant = Tenant.objects.create(
+            name=f'{PREFIX}{number}',
+            type=TENANT_TYPES[number % len(TENANT_TYPES)],
+            premium=premium,
+            patient_visible_fields=['all'] if premium else ['first_name', 'last_name', 'email'],
+            patient_records_type=Tenant.FLEXIBLE if number % 2 else Tenant.RIGID,
+        )
+        user = User.objects.create(username=f'{PREFIX}{number}', password=password)
+        UserProfile.objects.create(user=user, tenant=tenant)
+        tenant_patients = Patient.objects.bulk_create(
+            (
+                Patient(
+                    tenant=tenant, first_name=f'Name{index}', last_name=f'Last{index}',
+                    ssn=f'{index:09d}', email=f'{PREFIX}{number}-{index}@example.com',
+                )
+                for index in range(patients)
+            ),
+            batch_size=batch_size,
+        )
+        if tenant_patients:
+            model = FlexibleRecord if number % 2 else Record
+            model.objects.bulk_create(
+                (make_record(tenant, rng.choice(tenant_patients), rng) for _ in range(records)),
+                batch_size=batch_size,
+            )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+@dataclass
+class BenchUser:
+    username: str
+    flexible: bool
+    patient_ids: list
+    record_ids: list
+    token: str = None
+
+
+def bench_users(limit=None):
+    """The seeded users with a sample of their tenant's patient and record ids."""
+    profiles = (
+        UserProfile.objects.filter(user__username__startswith=PREFIX)
+        .select_related('user', 'tenant').order_by('user__username')
+    )
+    users = []
+    for profile in profiles[:limit]:
+        tenant = profile.tenant
+        model = FlexibleRecord if tenant.patient_records_type == Tenant.FLEXIBLE else Record
+        patient_ids = list(Patient.objects.for_tenant(tenant).values_list('id', flat=True)[:SAMPLE_IDS])
+        record_ids = list(model.objects.for_tenant(tenant).values_list('id', flat=True)[:SAMPLE_IDS])
+        users.append(BenchUser(
+            profile.user.username, tenant.patient_records_type == Tenant.FLEXIBLE,
+            patient_ids, record_ids,
+        ))
+    return users
+
+
+def patients_list(user, rng):
+    return 'GET', '/api/patients/', None
+
+
+def patients_detail(user, rng):
+    return 'GET', f'/api/patients/{rng.choice(user.patient_ids)}/', None
+
+
+def patients_expand(user, rng):
+    return 'GET', f'/api/patients/{rng.choice(user.patient_ids)}/?expand=records', None
+
+
+def records_list(user, rng):
+    return 'GET', '/api/records/', None
+
+
+def records_detail(user, rng):
+    return 'GET', f'/api/records/{rng.choice(user.record_ids)}/', None
+
+
+def patients_create(user, rng):
+    return 'POST', '/api/patients/', {
+        'first_name': 'Load', 'last_name': 'Test', 'ssn': '123-45-6789',
+        'email': f'{PREFIX}{uuid.uuid4().hex}@example.com',
+    }
+
+
+def records_create(user, rng):
+    body = {'patient': rng.choice(user.patient_ids)}
+    if user.flexible:
+        body['record_type'], body['data'] = make_data(rng)
+    else:
+        body.update(diagnosis=rng.choice(DIAGNOSES), treatment='Rest and fluids', doctor_name='Dr. Load')
+    return 'POST', '/api/records/', body
+
+
+# name: (request builder, weight)
+SCENARIOS = {
+    'patients-list': (patients_list, 30),
+    'patients-detail': (patients_detail, 25),
+    'patients-expand': (patients_expand, 5),
+    'records-list': (records_list, 20),
+    'records-detail': (records_detail, 10),
+    'patients-create': (patients_create, 5),
+    'records-create': (records_create, 5),
+}
+
+
+class InProcessTransport:
+    """django.test.Client on the current thread, counting its queries."""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(raise_request_exception=False)
+        self.queries = 0
+        self._wrapper = connection.execute_wrapper(self._count)
+        self._wrapper.__enter__()
+
+    def _count(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, method, path, token=None, body=None):
+        """Returns (status, parsed JSON or None, queries run)."""
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        before = self.queries
+        if method == 'GET':
+            response = self.client.get(path, **headers)
+        else:
+            response = self.client.generic(
+                method, path, json.dumps(body), content_type='application/json', **headers
+            )
+        data = None
+        if response.get('Content-Type', '').startswith('application/json') and not response.streaming:
+            data = json.loads(response.content or 'null')
+        return response.status_code, data, self.queries - before
+
+    def close(self):
+        self._wrapper.__exit__(None, None, None)
+        connections.close_all()
+
+
+class InProcessASGITransport:
+    """
+    django.test.AsyncClient, sending requests through Django's async
+    handler. Like ASGIHandler, each request runs its sync code (and async
+    ORM queries) on a thread of its own and closes its connection when it
+    finishes. Queries are read from the Server-Timing header.
+    """
+
+    def __init__(self):
+        from django.test import AsyncClient
+
+        self.client = AsyncClient(raise_request_exception=False)
+
+    async def request(self, method, path, token=None, body=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        async with ThreadSensitiveContext():
+            if method == 'GET':
+                response = await self.client.get(path, headers=headers)
+            else:
+                response = await self.client.generic(
+                    method, path, json.dumps(body), content_type='application/json', headers=headers
+                )
+            # AsyncClient leaves the connection open for test transactions.
+            await sync_to_async(close_old_connections)()
+        data = None
+        if response.get('Content-Type', '').startswith('application/json') and not response.streaming:
+            data = json.loads(response.content or 'null')
+        return response.status_code, data, server_timing_queries(response.get('Server-Timing'))
+
+    def close(self):
+        pass
+
+
+def server_timing_queries(header):
+    """Query count from the ``db`` entry of a Server-Timing header, if any."""
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        if name == 'db':
+            match = re.search(r'desc="(\d+) quer', params)
+            return int(match[1]) if match else None
+    return 0 if header else None
+
+
+class HTTPTransport:
+    """
+    Keep-alive HTTP connection to a running server. Queries are read from
+    the Server-Timing header (apps.api.instrumentation) when present.
+    """
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.base_path = parts.path.rstrip('/')
+        self.connection = connection_class(parts.netloc, timeout=30)
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        self.connection.request(method, self.base_path + path, payload, headers)
+        response = self.connection.getresponse()
+        content = response.read()
+        data = None
+        if response.getheader('Content-Type', '').startswith('application/json') and content:
+            data = json.loads(content)
+        return response.status, data, server_timing_queries(response.getheader('Server-Timing'))
+
+    def close(self):
+        self.connection.close()
+
+
+def log_in(transport, users):
+    for user in users:
+        status, data, _ = transport.request(
+            'POST', '/api/token/', body={'username': user.username, 'password': PASSWORD}
+        )
+        if status != 200:
+            raise RuntimeError(f'Could not log in as {user.username}: HTTP {status}')
+        user.token = data['access']
+
+
+async def alog_in(transport, users):
+    for user in users:
+        status, data, _ = await transport.request(
+            'POST', '/api/token/', body={'username': user.username, 'password': PASSWORD}
+        )
+        if status != 200:
+            raise RuntimeError(f'Could not log in as {user.username}: HTTP {status}')
+        user.token = data['access']
+
+
+@dataclass
+class Sample:
+    scenario: str
+    status: int
+    seconds: float
+    queries: int = None
+
+
+@dataclass
+class LoadResult:
+    samples: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def picker(scenarios, users):
+    """Returns pick(rng) -> (scenario, user, (method, path, body)) following the weights."""
+    names = list(scenarios)
+    weights = [SCENARIOS[name][1] for name in names]
+
+    def pick(rng):
+        name = rng.choices(names, weights)[0]
+        user = rng.choice(users)
+        return name, user, SCENARIOS[name][0](user, rng)
+    return pick
+
+
+def run_load(make_transport, users, scenarios, rng, concurrency=8, duration=10.0,
+             max_requests=None, warmup=0):
+    """
+    Sends requests from ``concurrency`` threads, each with its own transport
+    from ``make_transport()``, until ``duration`` seconds have passed or
+    ``max_requests`` requests were made. Every thread first sends ``warmup``
+    requests that are not measured.
+    """
+    pick = picker(scenarios, users)
+    seeds = [rng.random() for _ in range(concurrency)]
+    result = LoadResult()
+    lock = threading.Lock()
+    clock = {}
+    remaining = [max_requests]
+    errors = []
+
+    def start_clock():
+        clock['begin'] = time.perf_counter()
+        clock['deadline'] = clock['begin'] + duration
+
+    # Measuring starts once every thread has warmed up.
+    started = threading.Barrier(concurrency + 1, action=start_clock)
+
+    def take():
+        if max_requests is None:
+            return time.perf_counter() < clock['deadline']
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def send(transport, worker_rng):
+        name, user, (method, path, body) = pick(worker_rng)
+        start = time.perf_counter()
+        status, _, queries = transport.request(method, path, user.token, body)
+        return Sample(name, status, time.perf_counter() - start, queries)
+
+    def worker(worker_seed):
+        worker_rng = random.Random(worker_seed)
+        transport = None
+        samples = []
+        try:
+            transport = make_transport()
+            for _ in range(warmup):
+                send(transport, worker_rng)
+            started.wait()
+            while take():
+                samples.append(send(transport, worker_rng))
+        except Exception as exc:
+            errors.append(exc)
+            started.abort()
+        finally:
+            if transport is not None:
+                transport.close()
+        with lock:
+            result.samples.extend(samples)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in seeds]
+    for thread in threads:
+        thread.start()
+    try:
+        started.wait()
+    except threading.BrokenBarrierError:
+        pass
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    result.elapsed = time.perf_counter() - clock['begin']
+    return result
+
+
+async def run_load_async(make_transport, users, scenarios, rng, concurrency=8, duration=10.0,
+                         max_requests=None, warmup=0):
+    """
+    run_load() with ``concurrency`` tasks on the running event loop instead
+    of threads; ``make_transport()`` returns transports with an async
+    ``request``.
+    """
+    pick = picker(scenarios, users)
+    seeds = [rng.random() for _ in range(concurrency)]
+    result = LoadResult()
+    clock = {}
+    remaining = [max_requests]
+
+    def take():
+        if max_requests is None:
+            return time.perf_counter() < clock['deadline']
+        if remaining[0] <= 0:
+            return False
+        remaining[0] -= 1
+        return True
+
+    async def send(transport, worker_rng):
+        name, user, (method, path, body) = pick(worker_rng)
+        start = time.perf_counter()
+        status, _, queries = await transport.request(method, path, user.token, body)
+        return Sample(name, status, time.perf_counter() - start, queries)
+
+    async def warm(transport, worker_rng):
+        for _ in range(warmup):
+            await send(transport, worker_rng)
+
+    async def worker(transport, worker_rng):
+        while take():
+            result.samples.append(await send(transport, worker_rng))
+
+    workers = [(make_transport(), random.Random(seed)) for seed in seeds]
+    try:
+        # Measuring starts once every task has warmed up.
+        await asyncio.gather(*(warm(*args) for args in workers))
+        clock['begin'] = time.perf_counter()
+        clock['deadline'] = clock['begin'] + duration
+        await asyncio.gather(*(worker(*args) for args in workers))
+    finally:
+        for transport, _ in workers:
+            transport.close()
+    result.elapsed = time.perf_counter() - clock['begin']
+    return result
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summarize_samples(samples, elapsed):
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(sample.status >= 400 for sample in samples),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+    }
+
+
+def summarize(result):
+    """{scenario: stats} plus a 'total' entry, for the scenarios that ran."""
+    by_scenario = {}
+    for sample in result.samples:
+        by_scenario.setdefault(sample.scenario, []).append(sample)
+    summary = {
+        name: summarize_samples(samples, result.elapsed) for name, samples in sorted(by_scenario.items())
+    }
+    if result.samples:
+        summary['total'] = summarize_samples(result.samples, result.elapsed)
+    return summary
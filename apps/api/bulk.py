@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def get_bulk_items(request):
+    """Returns the list of items of a bulk request or raises a 400."""
+    items = request.data
+    if not isinstance(items, list):
+        raise ValidationError({'detail': 'Expected a list of items.'})
+    max_items = getattr(settings, 'API_BULK_MAX_ITEMS', 1000)
+    if len(items) > max_items:
+        raise ValidationError({'detail': f'A bulk request accepts at most {max_items} items.'})
+    return items
+
+
+def bulk_response(created, errors):
+    """
+    ``created`` is the serialized data of the rows written and ``errors``
+    maps the index of each rejected item to its validation errors.
+    201 when every item was written, 400 when none was, 207 otherwise.
+    """
+    if not errors:
+        code = status.HTTP_201_CREATED
+    elif not created:
+        code = status.HTTP_400_BAD_REQUEST
+    else:
+        code = status.HTTP_207_MULTI_STATUS
+    return Response({
+        'created': created,
+        'errors': [{'index': index, 'errors': detail} for index, detail in sorted(errors.items())],
+    }, status=code)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record, records_deleting
+from apps.tenant.models import Tenant
+
+
+def get_response_cache():
+    """
+    Cache backend for API responses, from the API_RESPONSE_CACHE alias of
+    CACHES; None, the default, disables caching. Invalidation only reaches
+    other processes through a shared backend such as RedisCache.
+    """
+    alias = getattr(settings, 'API_RESPONSE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def generation_key(tenant_id):
+    return f'api:gen:{tenant_id}'
+
+
+def tenant_generation(cache, tenant_id):
+    # Start from a timestamp so an evicted generation never reuses a value
+    # that older entries were stored under.
+    return cache.get_or_set(generation_key(tenant_id), time.time_ns, timeout=None)
+
+
+def invalidate_tenant(tenant_id):
+    """Makes every cached response of the tenant unreachable."""
+    cache = get_response_cache()
+    if cache is None or tenant_id is None:
+        return
+    try:
+        cache.incr(generation_key(tenant_id))
+    except ValueError:
+        cache.set(generation_key(tenant_id), time.time_ns(), timeout=None)
+
+
+def representation_signature(tenant):
+    """Tenant settings that shape patient and record representations."""
+    return [
+        tenant.patient_visible_fields,
+        tenant.ssn_hippa_mandatory,
+        tenant.patient_records_type,
+    ]
+
+
+def response_cache_key(cache, request, tenant):
+    settings_signature = representation_signature(tenant)
+    params = sorted((name, request.query_params.getlist(name)) for name in request.query_params)
+    fingerprint = json.dumps(
+        [request.get_host(), request.path, params, settings_signature], default=str
+    ).encode('utf-8')
+    digest = hashlib.sha1(fingerprint).hexdigest()
+    return f'api:resp:{tenant.pk}:{tenant_generation(cache, tenant.pk)}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Caches the data of successful ``cache_actions`` responses per tenant,
+    endpoint, query params and the tenant settings that shape the output.
+    Any write to the tenant's patients, records or configuration invalidates
+    them (see the signal receivers below).
+    """
+    cache_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(super().aretrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_response_cache()
+        tenant = getattr(request, 'tenant', None)
+        if cache is None or tenant is None or self.action not in self.cache_actions:
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(cache, request, tenant)
+        entry = cache.get(key)
+        if entry is not None:
+            return cached_entry_response(request, entry)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, cache_entry(response))
+            response['X-Cache'] = 'MISS'
+        return response
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        cache = get_response_cache()
+        tenant = getattr(request, 'tenant', None)
+        if cache is None or tenant is None or self.action not in self.cache_actions:
+            return await handler(request, *args, **kwargs)
+
+        key = await call_cache(cache, response_cache_key, cache, request, tenant)
+        entry = await call_cache(cache, cache.get, key)
+        if entry is not None:
+            return cached_entry_response(request, entry)
+
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            await call_cache(cache, cache.set, key, cache_entry(response))
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+def cache_entry(response):
+    validators = {
+        header: response[header] for header in ('ETag', 'Last-Modified') if response.has_header(header)
+    }
+    return response.data, validators
+
+
+def cached_entry_response(request, entry):
+    data, validators = entry
+    # Entries keep the validators of the response they were built
+    # from, so conditional requests are answered without queries.
+    not_modified = get_conditional_response(
+        request,
+        etag=validators.get('ETag'),
+        last_modified=parse_http_date_safe(validators.get('Last-Modified', '')),
+    )
+    response = not_modified or Response(data)
+    for header, value in validators.items():
+        response[header] = value
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+async def call_cache(cache, func, *args):
+    """
+    Runs ``func``, which uses ``cache``, from async code. LocMemCache is
+    in-process and never blocks, so it runs on the event loop; other
+    backends do network I/O and run in a thread.
+    """
+    if isinstance(cache, LocMemCache):
+        return func(*args)
+    return await sync_to_async(func)(*args)
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def _invalidate_tenant(sender, instance, **kwargs):
+    invalidate_tenant(instance.pk)
+
+
+# Records get no post_delete receiver, which would turn off Django's fast
+# delete for them: records deleted with their patient or tenant are covered
+# by the parent's receiver, the rest by records_deleting.
+@receiver([post_save, post_delete], sender=Patient)
+@receiver(post_save, sender=Record)
+@receiver(post_save, sender=FlexibleRecord)
+def _invalidate_tenant_data(sender, instance, **kwargs):
+    invalidate_tenant(instance.tenant_id)
+    # A patient moved to another tenant leaves the previous one too.
+    previous = getattr(instance, '_loaded_tenant_id', instance.tenant_id)
+    if previous != instance.tenant_id:
+        invalidate_tenant(previous)
+
+
+@receiver(records_deleting)
+def _invalidate_deleted_records(sender, queryset, **kwargs):
+    for tenant_id in queryset.order_by().values_list('tenant_id', flat=True).distinct():
+        invalidate_tenant(tenant_id)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import representation_signature
+
+
+class _ConditionalResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def row_version(row):
+    """
+    (pk, updated_at) of a served row, plus those of its expanded records.
+    Rows are model instances, or dicts when the view serves ``.values()``.
+    """
+    if isinstance(row, dict):
+        return [row['id'], row['updated_at'], []]
+    return [
+        row.pk,
+        row.updated_at,
+        [[record.pk, record.updated_at] for record in getattr(row, 'expanded_records', ())],
+    ]
+
+
+def strong_etag(request, tenant, versions):
+    fingerprint = json.dumps([
+        request.get_host(),
+        request.path,
+        sorted((name, request.query_params.getlist(name)) for name in request.query_params),
+        getattr(request.accepted_renderer, 'format', None),
+        representation_signature(tenant),
+        versions,
+    ], default=str).encode('utf-8')
+    return f'"{hashlib.sha1(fingerprint).hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETag (and Last-Modified on retrieve) for ``conditional_actions``,
+    derived from the id and updated_at of the rows about to be served. The
+    check runs right after the rows are fetched, so a matching
+    If-None-Match / If-Modified-Since gets a 304 before anything is
+    serialized.
+
+    Lists carry no Last-Modified: a deleted row leaves every remaining
+    updated_at untouched, so only the ETag can tell the page changed.
+    """
+    conditional_actions = ('list', 'retrieve')
+    version_columns = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional_response(super().aretrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        self._validators = None
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        try:
+            response = handler(request, *args, **kwargs)
+        except _ConditionalResponse as exc:
+            return exc.response
+        return self.add_validators(response)
+
+    async def aconditional_response(self, handler, request, *args, **kwargs):
+        self._validators = None
+        if self.action not in self.conditional_actions:
+            return await handler(request, *args, **kwargs)
+        try:
+            response = await handler(request, *args, **kwargs)
+        except _ConditionalResponse as exc:
+            return exc.response
+        return self.add_validators(response)
+
+    def add_validators(self, response):
+        if response.status_code == 200 and self._validators:
+            for header, value in self._validators.items():
+                response[header] = value
+        return response
+
+    def paginate_queryset(self, queryset):
+        return self.check_page(super().paginate_queryset(queryset))
+
+    async def apaginate_queryset(self, queryset):
+        return self.check_page(await super().apaginate_queryset(queryset))
+
+    def get_object(self):
+        return self.check_object(super().get_object())
+
+    async def aget_object(self):
+        return self.check_object(await super().aget_object())
+
+    def check_page(self, page):
+        if page is not None and self.action == 'list':
+            self.check_not_modified(
+                [row_version(row) for row in page] + [getattr(self.paginator, 'has_next', None)]
+            )
+        return page
+
+    def check_object(self, obj):
+        if self.action == 'retrieve':
+            modified = [obj.updated_at] + [r.updated_at for r in getattr(obj, 'expanded_records', ())]
+            self.check_not_modified(row_version(obj), last_modified=max(modified))
+        return obj
+
+    def check_not_modified(self, versions, last_modified=None):
+        """
+        Remembers the validators for the response and, when the request
+        preconditions decide the response (304, or 412 for If-Match), raises
+        it to conditional_response.
+        """
+        tenant = getattr(self.request, 'tenant', None)
+        if tenant is None:
+            return
+        etag = strong_etag(self.request, tenant, versions)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        self._validators = {'ETag': etag}
+        if timestamp is not None:
+            self._validators['Last-Modified'] = http_date(timestamp)
+        not_modified = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            for header, value in self._validators.items():
+                not_modified[header] = value
+            raise _ConditionalResponse(not_modified)
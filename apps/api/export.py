@@ -0,0 +1,62 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON = "ndjson"
+CSV = "csv"
+CONTENT_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv",
+}
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, record_serializer, patient_serializer):
+    """
+    Yield one dict per record, built with a single serializer instance each
+    for records and patients. The queryset is read with iterator(), which
+    uses a server-side cursor on PostgreSQL, so memory stays constant.
+    """
+    for record in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = record_serializer.to_representation(record)
+        row["patient_details"] = patient_serializer.to_representation(record.patient)
+        yield row
+
+
+def ndjson_lines(rows):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def csv_lines(rows, record_fields, patient_fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(list(record_fields) + [f"patient_{name}" for name in patient_fields])
+    for row in rows:
+        details = row.pop("patient_details")
+        values = [row.get(name) for name in record_fields] + [details.get(name) for name in patient_fields]
+        yield writer.writerow([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for value in values
+        ])
+
+
+def streaming_export(queryset, record_serializer, patient_serializer, export_format):
+    rows = export_rows(queryset, record_serializer, patient_serializer)
+    if export_format == CSV:
+        lines = csv_lines(rows, list(record_serializer.fields), list(patient_serializer.fields))
+    else:
+        lines = ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+    response["Content-Disposition"] = f'attachment; filename="records.{export_format}"'
+    return response
@@ -0,0 +1,136 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _identity(value):
+    return value
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return _identity
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+    # Same steps as DateTimeField.to_representation/enforce_timezone.
+    def convert(value):
+        if isinstance(value, str):
+            return value
+        if field_timezone is not None:
+            if timezone.is_aware(value):
+                value = value.astimezone(field_timezone)
+            else:
+                value = timezone.make_aware(value, field_timezone)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        if output_format.lower() == fields.ISO_8601:
+            value = value.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return value.strftime(output_format)
+    return convert
+
+
+def _converter(field):
+    """
+    Function turning a ``.values()`` column into what ``field`` would output,
+    or None when the field needs its serializer (nested, method, custom...).
+    """
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return _identity if field.pk_field is None else None
+    if isinstance(field, fields.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, fields.JSONField):
+        return None if field.binary else _identity
+    if isinstance(field, fields.CharField):
+        return str
+    if isinstance(field, fields.IntegerField):
+        return int
+    if isinstance(field, fields.BooleanField):
+        return bool
+    return None
+
+
+class RowPlan:
+    """
+    Column-to-output plan compiled from a ModelSerializer: rows fetched with
+    ``.values(*plan.columns)`` are turned into the same dicts the serializer
+    would produce, without going through per-field serializer objects.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.columns = [column for _, column, _ in entries]
+
+    @classmethod
+    def compile(cls, serializer):
+        entries = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                return None
+            convert = _converter(field)
+            if convert is None:
+                return None
+            entries.append((name, field.source, convert))
+        return cls(entries)
+
+    def convert(self, row):
+        return {
+            name: None if row[column] is None else convert(row[column])
+            for name, column, convert in self.entries
+        }
+
+    def convert_many(self, rows):
+        return [self.convert(row) for row in rows]
+
+
+class FastListMixin:
+    """
+    Opt-in (API_FAST_LIST_SERIALIZATION) list path that fetches exactly the
+    serializer's columns with ``.values()`` and converts them with a RowPlan.
+    The output is the same as the serializer's; views whose serializer has
+    fields a RowPlan cannot express fall back to the regular list.
+    """
+
+    def use_fast_list(self):
+        return getattr(settings, 'API_FAST_LIST_SERIALIZATION', False)
+
+    def fast_list_plan(self):
+        """The RowPlan of the list serializer, or None to use the regular list."""
+        if not self.use_fast_list():
+            return None
+        return RowPlan.compile(self.get_serializer())
+
+    def fast_list_rows(self, plan):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [field.lstrip('-') for field in getattr(self.paginator, 'ordering', ())]
+        versions = getattr(self, 'version_columns', ())
+        return queryset.values(*dict.fromkeys(plan.columns + ordering + list(versions)))
+
+    def list(self, request, *args, **kwargs):
+        plan = self.fast_list_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        rows = self.fast_list_rows(plan)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.convert_many(page))
+        return Response(plan.convert_many(rows))
+
+    async def alist(self, request, *args, **kwargs):
+        plan = self.fast_list_plan()
+        if plan is None:
+            return await super().alist(request, *args, **kwargs)
+        rows = self.fast_list_rows(plan)
+        page = await self.apaginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.convert_many(page))
+        return Response(plan.convert_many([row async for row in rows]))
@@ -0,0 +1,149 @@
+import json
+import re
+from datetime import datetime, time
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.fields.json import KeyTransform
+from django.db.models.lookups import Exact
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from apps.records.models import FlexibleRecord
+
+DATA_KEY_PREFIX = 'data.'
+DATA_KEY_RE = re.compile(r'^[\w-]+$')
+
+
+def parse_moment(name, value):
+    # The parsers raise ValueError for well formatted but invalid values,
+    # e.g. month 13.
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def json_candidates(value):
+    """
+    Query string values are text, but the stored JSON may hold the number or
+    boolean: ``?data.bpm=71`` matches both ``"71"`` and ``71``.
+    """
+    candidates = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return candidates
+    if parsed is not None and not isinstance(parsed, (str, dict, list)):
+        candidates.append(parsed)
+    return candidates
+
+
+class RecordFilterBackend(BaseFilterBackend):
+    """
+    Query string filters for /api/records/.
+
+    - ``created_after`` (inclusive) and ``created_before`` (exclusive): ISO
+      date or datetime, for every tenant.
+    - ``record_type=<type>``: flexible tenants.
+    - ``data.<key>=<value>``: flexible tenants, top-level key equals value.
+    - ``data_contains=<json object>``: flexible tenants, JSON containment.
+    - ``data_has_key=<key>``: flexible tenants.
+
+    On PostgreSQL the ``data`` filters are expressed as ``@>`` containment so
+    they can use the GIN index on FlexibleRecord.data.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if 'created_after' in params:
+            queryset = queryset.filter(created_at__gte=parse_moment('created_after', params['created_after']))
+        if 'created_before' in params:
+            queryset = queryset.filter(created_at__lt=parse_moment('created_before', params['created_before']))
+
+        flexible_params = [
+            name for name in params
+            if name in ('record_type', 'data_contains', 'data_has_key') or name.startswith(DATA_KEY_PREFIX)
+        ]
+        if not flexible_params:
+            return queryset
+        if queryset.model is not FlexibleRecord:
+            raise ValidationError({
+                name: 'Only available for tenants with flexible records.' for name in flexible_params
+            })
+
+        supports_contains = connections[queryset.db].features.supports_json_field_contains
+
+        if 'record_type' in params:
+            queryset = queryset.filter(record_type=params['record_type'])
+
+        for name in flexible_params:
+            if not name.startswith(DATA_KEY_PREFIX):
+                continue
+            key = name[len(DATA_KEY_PREFIX):]
+            if not DATA_KEY_RE.match(key):
+                raise ValidationError({name: 'Invalid key.'})
+            condition = Q()
+            for candidate in json_candidates(params[name]):
+                if supports_contains:
+                    condition |= Q(data__contains={key: candidate})
+                else:
+                    condition |= Q(Exact(KeyTransform(key, 'data'), candidate))
+            queryset = queryset.filter(condition)
+
+        if 'data_contains' in params:
+            try:
+                document = json.loads(params['data_contains'])
+            except ValueError:
+                document = None
+            if not isinstance(document, dict):
+                raise ValidationError({'data_contains': 'Expected a JSON object.'})
+            if supports_contains:
+                queryset = queryset.filter(data__contains=document)
+            else:
+                for key, value in document.items():
+                    queryset = queryset.filter(Exact(KeyTransform(key, 'data'), value))
+
+        if 'data_has_key' in params:
+            queryset = queryset.filter(data__has_key=params['data_has_key'])
+
+        return queryset
+
+
+class AuditLogFilterBackend(BaseFilterBackend):
+    """
+    Query string filters for /api/audit-logs/: ``user`` (id), ``model``,
+    ``action``, ``object_id`` and ``timestamp_after`` (inclusive) /
+    ``timestamp_before`` (exclusive). The tenant is always part of the
+    query, so user and action filters use the (tenant, user|action,
+    timestamp, id) indexes and time ranges only read the matching monthly
+    partitions on PostgreSQL.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        for name in ('user', 'object_id'):
+            if name in params:
+                try:
+                    queryset = queryset.filter(**{name: int(params[name])})
+                except ValueError:
+                    raise ValidationError({name: 'Expected an integer.'})
+        for name in ('model', 'action'):
+            if name in params:
+                queryset = queryset.filter(**{name: params[name]})
+        if 'timestamp_after' in params:
+            queryset = queryset.filter(timestamp__gte=parse_moment('timestamp_after', params['timestamp_after']))
+        if 'timestamp_before' in params:
+            queryset = queryset.filter(timestamp__lt=parse_moment('timestamp_before', params['timestamp_before']))
+        return queryset
@@ -0,0 +1,213 @@
+"""
+Per-request timings and in-process metrics (see InstrumentationMiddleware).
+
+While a request is instrumented its RequestTimings lives in a context
+variable. Code marks its phases with ``with phase('auth'):``. Every
+database connection gets ``execute_wrapper`` when it connects, which
+hands queries to the current timings, so query time goes to the ``db``
+phase, also for queries async views run in a thread. Phases are
+exclusive: the queries run while authenticating count as ``db`` and not
+as ``auth``, so the phases add up to the total.
+
+Finished requests feed the histograms of REGISTRY, which ``/api/metrics/``
+renders in the Prometheus text format. They are per process: scrape every
+worker, or run a single one when measuring.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_current = ContextVar('request_timings', default=None)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestTimings:
+    """Exclusive time and call count of each phase of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.total = None
+        self._stack = []
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.durations[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+        self.counts[name] += 1
+
+    def exit(self):
+        now = time.perf_counter()
+        name, started = self._stack.pop()
+        self.durations[name] += now - started
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def exit_phase(self, name):
+        """Closes ``name`` if it is the current phase (phases opened by middleware hooks)."""
+        if self._stack and self._stack[-1][0] == name:
+            self.exit()
+
+    def finish(self):
+        while self._stack:
+            self.exit()
+        self.total = time.perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        self.enter('db')
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.exit()
+
+    def server_timing(self):
+        entries = []
+        for name, seconds in self.durations.items():
+            entry = f'{name};dur={seconds * 1000:.2f}'
+            if name == 'db':
+                noun = 'query' if self.counts[name] == 1 else 'queries'
+                entry += f';desc="{self.counts[name]} {noun}"'
+            elif self.counts[name] > 1:
+                entry += f';desc="{self.counts[name]} calls"'
+            entries.append(entry)
+        entries.append(f'total;dur={self.total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _instrument_connection(sender, connection, **kwargs):
+    # First in the list: connection.execute_wrapper() blocks pop the last one.
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def recording(timings):
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Times the block as ``name`` on the current request, if instrumented."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.enter(name)
+    try:
+        yield
+    finally:
+        timings.exit()
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, max_series=None, **labels):
+        """
+        Past ``max_series`` label sets, new ones are counted under
+        ``other`` for every label, so the series stay bounded.
+        """
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None and max_series is not None and len(self._series) >= max_series:
+                key = ('other',) * len(self.labels)
+                series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = ','.join(f'{label}="{value}"' for label, value in zip(self.labels, key))
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{labels}}} {total}'
+            yield f'{self.name}_count{{{labels}}} {count}'
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram', *self.samples()]
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    'api_request_duration_seconds', 'Request latency.', ('view', 'method', 'status'), SECONDS_BUCKETS
+)
+PHASE_SECONDS = Histogram(
+    'api_request_phase_seconds', 'Time spent in each request phase.', ('view', 'phase'), SECONDS_BUCKETS
+)
+QUERIES = Histogram('api_request_queries', 'Database queries per request.', ('view',), QUERY_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'api_response_size_bytes', 'Response body size (streaming responses excluded).', ('view',), SIZE_BUCKETS
+)
+# Opt-in: one series per tenant for the first API_METRICS_TENANT_SERIES
+# tenants a process serves, the rest under tenant="other".
+TENANT_SECONDS = Histogram(
+    'api_tenant_request_duration_seconds', 'Request latency per tenant.', ('tenant',), SECONDS_BUCKETS
+)
+REGISTRY = [REQUEST_SECONDS, PHASE_SECONDS, QUERIES, RESPONSE_BYTES, TENANT_SECONDS]
+
+
+def observe_request(timings, view, method, status, size, tenant_id):
+    REQUEST_SECONDS.observe(timings.total, view=view, method=method, status=status)
+    for name, seconds in timings.durations.items():
+        PHASE_SECONDS.observe(seconds, view=view, phase=name)
+    QUERIES.observe(timings.counts['db'], view=view)
+    if size is not None:
+        RESPONSE_BYTES.observe(size, view=view)
+    tenant_series = getattr(settings, 'API_METRICS_TENANT_SERIES', 0)
+    if tenant_id is not None and tenant_series:
+        TENANT_SECONDS.observe(timings.total, max_series=tenant_series, tenant=tenant_id)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
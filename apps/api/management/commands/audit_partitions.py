@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.api.partitions import (
+    add_months, create_partition, drop_partition, is_partitioned, monthly_partitions,
+    month_start, purge_default_partition,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the audit log partitions of the coming months and drops (or "
+        "only detaches) the ones past the retention period (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=getattr(settings, 'AUDIT_LOG_PARTITIONS_AHEAD', 3),
+            help='Months to create after the current one.'
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=getattr(settings, 'AUDIT_LOG_RETENTION_MONTHS', None),
+            help='Months to keep, counting the current one. Older partitions are removed.'
+        )
+        parser.add_argument(
+            '--detach-only', action='store_true',
+            help='Detach expired partitions but keep their tables, e.g. to archive them.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only print what would change.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The audit log is only partitioned on PostgreSQL.')
+        current = month_start(timezone.now())
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('The audit log table is not partitioned, run the migrations first.')
+            existing = monthly_partitions(cursor)
+
+            for offset in range(options['ahead'] + 1):
+                month = add_months(current, offset)
+                if month in existing:
+                    continue
+                self.stdout.write(f'create {month:%Y-%m}')
+                if not options['dry_run']:
+                    create_partition(cursor, month)
+
+            retention = options['retention_months']
+            if retention is None:
+                return
+            if retention < 1:
+                raise CommandError('--retention-months must keep at least the current month.')
+            cutoff = add_months(current, 1 - retention)
+            for month, name in sorted(existing.items()):
+                if month >= cutoff:
+                    continue
+                self.stdout.write(f"{'detach' if options['detach_only'] else 'drop'} {name}")
+                if not options['dry_run']:
+                    drop_partition(cursor, name, detach_only=options['detach_only'])
+            if not options['dry_run']:
+                purged = purge_default_partition(cursor, cutoff)
+                if purged:
+                    self.stdout.write(f'deleted {purged} expired rows from the default partition')
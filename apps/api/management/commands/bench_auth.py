@@ -0,0 +1,88 @@
+import re
+import statistics
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from apps.api.benchmark import InProcessTransport, bench_users, log_in
+from apps.tenant import authentication
+from apps.tenant.authentication import CachedJWTAuthentication
+
+
+@contextmanager
+def swapped(owner, name, value):
+    original = getattr(owner, name)
+    setattr(owner, name, value)
+    try:
+        yield original
+    finally:
+        setattr(owner, name, original)
+
+
+def decode_per_caller(request):
+    """authenticate_request without the per-request memo, as before the resolver."""
+    return CachedJWTAuthentication().authenticate(getattr(request, "_request", request))
+
+
+def timing_ms(header, name):
+    match = re.search(rf'(?:^|, ){name};dur=([\d.]+)', header or '')
+    return float(match[1]) if match else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends authenticated requests in process as a seed_benchmark user and "
+        "compares the JWT decodes and auth time per request with the shared "
+        "resolver (apps.tenant.authentication.authenticate_request) and with "
+        "every caller decoding the token again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--path', default='/api/patients/?page_size=1')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'API_INSTRUMENTATION', True):
+            raise CommandError('Auth time is read from Server-Timing: enable API_INSTRUMENTATION.')
+        users = bench_users(limit=1)
+        if not users:
+            raise CommandError('No benchmark users: run seed_benchmark first.')
+        transport = InProcessTransport()
+        try:
+            log_in(transport, users)
+        finally:
+            transport.close()
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {users[0].token}')
+        self.stdout.write(f"{options['requests']} x GET {options['path']} as {users[0].username}\n")
+        self.stdout.write(f"{'mode':<12} {'decodes/req':>11} {'auth p50 ms':>12} {'total p50 ms':>13}")
+        for mode in ('per caller', 'resolver'):
+            if mode == 'per caller':
+                with swapped(authentication, 'authenticate_request', decode_per_caller):
+                    decodes, auth, total = self.measure(client, options['path'], options['requests'])
+            else:
+                decodes, auth, total = self.measure(client, options['path'], options['requests'])
+            self.stdout.write(
+                f"{mode:<12} {decodes:>11.2f} {statistics.median(auth):>12.3f} {statistics.median(total):>13.3f}"
+            )
+
+    def measure(self, client, path, requests):
+        calls = 0
+        original = CachedJWTAuthentication.get_validated_token
+
+        def get_validated_token(self, raw_token):
+            nonlocal calls
+            calls += 1
+            return original(self, raw_token)
+
+        auth, total = [], []
+        with swapped(CachedJWTAuthentication, 'get_validated_token', get_validated_token):
+            for _ in range(requests):
+                response = client.get(path)
+                if response.status_code != 200:
+                    raise CommandError(f'GET {path} returned HTTP {response.status_code}')
+                auth.append(timing_ms(response['Server-Timing'], 'auth'))
+                total.append(timing_ms(response['Server-Timing'], 'total'))
+        return calls / requests, auth, total
@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from apps.api.benchmark import make_data
+from apps.api.filters import RecordFilterBackend
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord
+from apps.tenant.models import Tenant
+
+FILTERS = [
+    'record_type=Lab',
+    'data.test=glucose',
+    'data.bpm=71',
+    'data_contains={"test": "hba1c", "fasting": true}',
+    'data_has_key=device',
+    'record_type=Vitals&data.bpm=71&created_after=2000-01-01',
+]
+
+SEQSCAN_SETTINGS = ('enable_indexscan', 'enable_bitmapscan', 'enable_indexonlyscan')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds flexible records in a rolled-back transaction and compares the "
+        "latency of the /api/records/ data filters with and without indexes "
+        "(PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The GIN index only exists on PostgreSQL.')
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            tenant = Tenant.objects.create(
+                name='bench-filters', type='mobile_app', patient_records_type=Tenant.FLEXIBLE
+            )
+            patients = Patient.objects.bulk_create(
+                Patient(tenant=tenant, email=f'bench-filters-{i}@example.com') for i in range(1000)
+            )
+            records = []
+            for _ in range(options['rows']):
+                kind, data = make_data(rng)
+                records.append(FlexibleRecord(
+                    patient=rng.choice(patients), tenant=tenant, record_type=kind, data=data
+                ))
+            FlexibleRecord.objects.bulk_create(records, batch_size=5000)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE records_flexiblerecord')
+
+            self.stdout.write(f"{options['rows']} flexible records, median of {options['runs']} runs\n")
+            self.stdout.write(f"{'filter':<60} {'rows':>7} {'indexed ms':>11} {'seqscan ms':>11}")
+            for query in FILTERS:
+                queryset = self.filtered(tenant, query)
+                count = queryset.count()
+                indexed = self.median_ms(queryset, options['runs'])
+                with connection.cursor() as cursor:
+                    for name in SEQSCAN_SETTINGS:
+                        cursor.execute(f'SET LOCAL {name} = off')
+                seqscan = self.median_ms(queryset, options['runs'])
+                with connection.cursor() as cursor:
+                    for name in SEQSCAN_SETTINGS:
+                        cursor.execute(f'RESET {name}')
+                self.stdout.write(f"{query:<60} {count:>7} {indexed:>11.2f} {seqscan:>11.2f}")
+            transaction.set_rollback(True)
+
+    def filtered(self, tenant, query):
+        request = Request(RequestFactory().get('/api/records/?' + query))
+        queryset = FlexibleRecord.objects.filter(tenant=tenant)
+        return RecordFilterBackend().filter_queryset(request, queryset, None)
+
+    def median_ms(self, queryset, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,65 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.api.models import AuditLog
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record
+from apps.tenant.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Prints the plan and median latency of the tenant-scoped hot queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Tenant id (defaults to the first tenant).')
+        parser.add_argument('--runs', type=int, default=20, help='Timed executions per query.')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Use EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by('id')
+        tenant = tenants.filter(pk=options['tenant']).first() if options['tenant'] else tenants.first()
+        if tenant is None:
+            raise CommandError('No tenant found.')
+        patient = Patient.objects.filter(tenant=tenant).order_by('id').first()
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        since = timezone.now() - timedelta(days=30)
+
+        queries = {
+            'patients list page': Patient.objects.filter(tenant=tenant).order_by('id')[:page_size],
+            'records list page': Record.objects.filter(tenant=tenant).order_by('created_at', 'id')[:page_size],
+            'records list page (join on patient)': (
+                Record.objects.filter(patient__tenant=tenant).order_by('created_at', 'id')[:page_size]
+            ),
+            'flexible records list page': (
+                FlexibleRecord.objects.filter(tenant=tenant).order_by('created_at', 'id')[:page_size]
+            ),
+            'patient records': Record.objects.filter(patient=patient).order_by('created_at')[:page_size],
+            'audit log by tenant and time': (
+                AuditLog.objects.filter(tenant=tenant, timestamp__gte=since).order_by('-timestamp')[:page_size]
+            ),
+        }
+
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+
+        self.stdout.write(f"Tenant {tenant.pk} ({tenant}) on {connection.vendor}\n")
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: median {statistics.median(timings):.3f} ms over {len(timings)} runs"
+            ))
+            self.stdout.write(queryset.explain(**explain_options) + "\n")
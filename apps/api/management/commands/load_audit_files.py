@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+from io import StringIO
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.api.models import AuditDailyCount, AuditFileImport, AuditLog
+from apps.api.sinks import read_events, rotate_orphaned_files, rotated_files
+
+COLUMNS = ("tenant_id", "user_id", "model", "object_id", "action", "timestamp", "metadata")
+
+
+def copy_events(events):
+    """Loads events into AuditLog with one COPY ... FROM STDIN (PostgreSQL)."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for event in events:
+        writer.writerow([
+            event["tenant_id"], event["user_id"], event["model"], event["object_id"],
+            event["action"], event["timestamp"].isoformat(), json.dumps(event["metadata"]),
+        ])
+    # None is written as an empty field, which COPY reads as NULL; the text
+    # columns are forced NOT NULL so empty strings stay empty strings.
+    sql = (
+        f"COPY {AuditLog._meta.db_table} ({', '.join(COLUMNS)}) FROM STDIN "
+        f"WITH (FORMAT csv, FORCE_NOT_NULL (model, action))"
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        buffer.seek(0)
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the rotated audit files written by apps.api.sinks.JSONLFileSink "
+        "into AuditLog (with COPY on PostgreSQL) and updates the daily counts. "
+        "Each file is loaded in one transaction and then deleted. Current files "
+        "of writers that are gone are rotated first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', nargs='?',
+            default=getattr(settings, 'AUDIT_LOG', {}).get('SINK_OPTIONS', {}).get('directory'),
+            help="Directory of the audit files, AUDIT_LOG['SINK_OPTIONS']['directory'] by default."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Events sent to the database per COPY (or bulk_create).'
+        )
+        parser.add_argument('--keep', action='store_true', help='Do not delete the files once loaded.')
+        parser.add_argument(
+            '--stale-after', type=float,
+            help='Also rotate current files of any host not written to for this many seconds. '
+                 'Without it only files of dead processes on this host are.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['directory']:
+            raise CommandError('No audit file directory given or configured.')
+        for prefix in rotate_orphaned_files(options['directory'], options['stale_after']):
+            self.stdout.write(f'rotated {os.path.basename(prefix)} (writer gone)')
+        for path in rotated_files(options['directory']):
+            name = os.path.basename(path)
+            if AuditFileImport.objects.filter(name=name).exists():
+                self.stdout.write(f'skip {name} (already loaded)')
+            else:
+                rows = self.load(path, options['batch_size'])
+                self.stdout.write(f'loaded {name}: {rows} events')
+            if not options['keep']:
+                os.remove(path)
+
+    def load(self, path, batch_size):
+        events = read_events(path)
+        rows = 0
+        with transaction.atomic():
+            while batch := list(islice(events, batch_size)):
+                if connection.vendor == 'postgresql':
+                    copy_events(batch)
+                else:
+                    AuditLog.objects.bulk_create([AuditLog(**event) for event in batch])
+                AuditDailyCount.objects.add_events(batch)
+                rows += len(batch)
+            AuditFileImport.objects.create(name=os.path.basename(path), rows=rows)
+        return rows
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import random
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api.benchmark import (
+    SCENARIOS, HTTPTransport, InProcessASGITransport, InProcessTransport, alog_in, bench_users, log_in,
+    run_load, run_load_async, summarize,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the JWT endpoints with the `manage.py seed_benchmark` users from "
+        "concurrent threads and prints p50/p95/p99 latency, requests/s and "
+        "queries per request for each endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server (e.g. http://localhost:8000). '
+                 'Without it requests go through django.test.Client in this process.'
+        )
+        parser.add_argument(
+            '--interface', choices=('wsgi', 'asgi'), default='wsgi',
+            help='In process, send the requests from threads through the WSGI-style test client '
+                 '(wsgi) or from tasks on one event loop through the ASGI handler (asgi), to '
+                 'compare with API_ASYNC_VIEWS. Ignored with --url.'
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads or tasks.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to measure.')
+        parser.add_argument('--requests', type=int, help='Stop after this many requests instead.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per thread.')
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"Comma separated endpoints to mix, from: {', '.join(SCENARIOS)}."
+        )
+        parser.add_argument('--users', type=int, help='Only use the first N benchmark users.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', help='Also write the results to this file.')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown or not scenarios:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}" if unknown else 'No scenarios.')
+        users = bench_users(options['users'])
+        if not users:
+            raise CommandError('No benchmark users found, run `manage.py seed_benchmark` first.')
+
+        load_options = dict(
+            concurrency=options['concurrency'], duration=options['duration'],
+            max_requests=options['requests'], warmup=options['warmup'],
+        )
+        asgi = not options['url'] and options['interface'] == 'asgi'
+        if options['url']:
+            make_transport = partial(HTTPTransport, options['url'])
+        else:
+            make_transport = InProcessASGITransport if asgi else InProcessTransport
+            if settings.DEBUG:
+                self.stderr.write('DEBUG is on: in-process timings include query logging.')
+        if asgi:
+            if not getattr(settings, 'API_ASYNC_VIEWS', False):
+                self.stderr.write('API_ASYNC_VIEWS is off: the ASGI handler runs the sync views in threads.')
+            result = asyncio.run(self.run_async(make_transport, users, scenarios, options, load_options))
+        else:
+            transport = make_transport()
+            try:
+                log_in(transport, users)
+            finally:
+                transport.close()
+            result = run_load(make_transport, users, scenarios, random.Random(options['seed']), **load_options)
+        summary = summarize(result)
+        if options['url']:
+            target = f"HTTP {options['url']}"
+        else:
+            target = f"in process ({options['interface'].upper()})"
+        self.stdout.write(
+            f"{len(users)} users, {options['concurrency']} {'tasks' if asgi else 'threads'}, "
+            f"{target}, {result.elapsed:.1f}s\n"
+        )
+        self.stdout.write(
+            f"{'endpoint':<18} {'requests':>8} {'errors':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for name, stats in summary.items():
+            queries = stats['queries_per_request']
+            self.stdout.write(
+                f"{name:<18} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                f"{'-' if queries is None else f'{queries:.1f}':>8}"
+            )
+        if options['json']:
+            report = {
+                'options': {key: options[key] for key in ('url', 'interface', 'concurrency', 'duration', 'requests', 'warmup', 'users')},
+                'scenarios': scenarios,
+                'elapsed': result.elapsed,
+                'results': summary,
+            }
+            with open(options['json'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+
+    async def run_async(self, make_transport, users, scenarios, options, load_options):
+        transport = make_transport()
+        try:
+            await alog_in(transport, users)
+        finally:
+            transport.close()
+        return await run_load_async(
+            make_transport, users, scenarios, random.Random(options['seed']), **load_options
+        )
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.api.models import Tombstone
+from apps.api.sync import sync_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the tombstones no valid sync token can still need: older than "
+        "API_SYNC_TOKEN_MAX_AGE_DAYS, plus API_SYNC_SETTLE_SECONDS of margin. "
+        "Clients with older tokens get a 410 and start a full sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only print how many would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = sync_cutoff() - timedelta(seconds=getattr(settings, 'API_SYNC_SETTLE_SECONDS', 5))
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} tombstones before {cutoff.isoformat()}')
+            return
+        deleted, _ = expired.delete()
+        self.stdout.write(f'deleted {deleted} tombstones before {cutoff.isoformat()}')
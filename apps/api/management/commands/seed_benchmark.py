@@ -0,0 +1,34 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api.benchmark import PASSWORD, PREFIX, clear, seed
+from apps.tenant.models import Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds the benchmark tenants used by `manage.py loadtest`: rigid and "
+        "flexible, premium and non-premium, each with a user, patients and records."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=8)
+        parser.add_argument('--patients', type=int, default=1000, help='Patients per tenant.')
+        parser.add_argument('--records', type=int, default=10000, help='Records per tenant.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--reset', action='store_true', help='Delete existing benchmark data first.')
+
+    def handle(self, *args, **options):
+        if Tenant.objects.filter(name__startswith=PREFIX).exists():
+            if not options['reset']:
+                raise CommandError('Benchmark data already exists, use --reset to replace it.')
+            clear()
+        start = time.perf_counter()
+        seed(options['tenants'], options['patients'], options['records'], random.Random(options['seed']))
+        self.stdout.write(
+            f"Seeded {options['tenants']} tenants with {options['patients']} patients and "
+            f"{options['records']} records each in {time.perf_counter() - start:.1f}s. "
+            f"Users {PREFIX}0..{PREFIX}{options['tenants'] - 1}, password '{PASSWORD}'."
+        )
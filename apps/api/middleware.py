@@ -1,84 +1,253 @@
-
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from apps.tenant.authentication import aresolve_tenant, resolve_tenant
 from django.contrib.auth.models import AnonymousUser
 from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
 from django.http import JsonResponse
+from django.utils import timezone
 
-from .models import AuditLog
+from .audit import get_audit_writer
+from .instrumentation import RequestTimings, current_timings, observe_request, phase, recording
 
 
 class DRFTenantMiddleware:
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
         if request.path.startswith("/api/"):
             try:
-                jwt_auth = JWTAuthentication()
-                auth_result = jwt_auth.authenticate(request)
-                if auth_result:
-                    user, _ = auth_result
-                    request.user = user
-                    tenant = getattr(getattr(user, "profile", None), "tenant", None)
-                    if not tenant:
-                        return JsonResponse(
-                            {"detail": "Malformed token or tenant not assigned."},
-                            status=400
-                        )
-                    request.tenant = tenant
-                else:
-                    request.user = AnonymousUser()
+                failure = self.attach(request, *resolve_tenant(request))
             except AuthenticationFailed as e:
                 return JsonResponse({"detail": str(e)}, status=401)
             except Exception:
                 request.user = AnonymousUser()
+            else:
+                if failure:
+                    return failure
 
         response = self.get_response(request)
         return response
-    
+
+    async def __acall__(self, request):
+        if request.path.startswith("/api/"):
+            try:
+                failure = self.attach(request, *await aresolve_tenant(request))
+            except AuthenticationFailed as e:
+                return JsonResponse({"detail": str(e)}, status=401)
+            except Exception:
+                request.user = AnonymousUser()
+            else:
+                if failure:
+                    return failure
+
+        return await self.get_response(request)
+
+    def attach(self, request, user, tenant):
+        """Sets request.user and request.tenant, or returns the error response."""
+        if not user:
+            request.user = AnonymousUser()
+            return None
+        request.user = user
+        if not tenant:
+            return JsonResponse(
+                {"detail": "Malformed token or tenant not assigned."},
+                status=400
+            )
+        request.tenant = tenant
+        return None
+
+
+class InstrumentationMiddleware:
+    """
+    Times every request by phase (apps.api.instrumentation): ``auth`` (JWT
+    authentication, with its call count), ``db`` (queries, with their
+    count), ``view`` (the view's own code, mostly serialization), ``audit``
+    and ``render``. Adds them as a ``Server-Timing`` header and feeds the
+    histograms served at /api/metrics/.
+
+    Goes first in MIDDLEWARE so the other middlewares are timed too. Works
+    in sync and async (ASGI) stacks. Disabled with API_INSTRUMENTATION = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Django runs sync hooks of an async stack through sync_to_async.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not getattr(settings, 'API_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        with recording(timings):
+            try:
+                response = self.get_response(request)
+            finally:
+                timings.finish()
+        return self.report(request, response, timings)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'API_INSTRUMENTATION', True):
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        with recording(timings):
+            try:
+                response = await self.get_response(request)
+            finally:
+                timings.finish()
+        return self.report(request, response, timings)
+
+    def report(self, request, response, timings):
+        response['Server-Timing'] = timings.server_timing()
+        match = request.resolver_match
+        tenant = getattr(request, 'tenant', None)
+        observe_request(
+            timings,
+            view=match.view_name if match else 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            size=None if response.streaming else len(response.content),
+            tenant_id=getattr(tenant, 'pk', None),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started()
+
+    def process_template_response(self, request, response):
+        self.render_started()
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started()
+
+    async def aprocess_template_response(self, request, response):
+        self.render_started()
+        return response
+
+    def view_started(self):
+        timings = current_timings()
+        if timings is not None:
+            timings.enter('view')
+
+    def render_started(self):
+        # DRF responses are rendered after process_template_response: what
+        # follows is render.
+        timings = current_timings()
+        if timings is not None:
+            timings.exit_phase('view')
+            timings.enter('render')
+
 
 class AuditMixin:
     """
     Mixin para registrar acciones de auditoría en todos los endpoints DRF.
-    Solo se activa si el tenant es premium.
+    Solo se activa si el tenant es premium. Los eventos se encolan y se
+    escriben en lotes fuera del request (ver apps.api.audit).
     """
 
-    def log_audit(self, action, instance=None, extra=None):
+    def audit_event(self, action, instance=None, extra=None, object_id=None):
+        """Valores del AuditLog de la acción, o None si el tenant no se audita."""
         tenant = getattr(self.request, "tenant", None)
         if not tenant or not tenant.premium:
-            return
-
-        AuditLog.objects.create(
-            tenant=tenant,
-            user=self.request.user if self.request.user.is_authenticated else None,
-            model=instance.__class__.__name__ if instance else self.get_queryset().model.__name__,
-            object_id=getattr(instance, "id", None),
-            action=action,
-            metadata={
+            return None
+        return {
+            "tenant_id": tenant.pk,
+            "user_id": self.request.user.pk if self.request.user.is_authenticated else None,
+            "model": instance.__class__.__name__ if instance else self.get_queryset().model.__name__,
+            "object_id": getattr(instance, "id", object_id),
+            "action": action,
+            "timestamp": timezone.now(),
+            "metadata": {
                 "path": self.request.path,
                 "method": self.request.method,
                 "query": dict(self.request.GET),
                 **(extra or {}),
             },
-        )
+        }
+
+    def log_audit(self, action, instance=None, extra=None, object_id=None):
+        event = self.audit_event(action, instance, extra, object_id)
+        if event is not None:
+            with phase("audit"):
+                get_audit_writer().submit(event)
+
+    async def alog_audit(self, action, instance=None, extra=None, object_id=None):
+        event = self.audit_event(action, instance, extra, object_id)
+        if event is not None:
+            with phase("audit"):
+                await get_audit_writer().asubmit(event)
+
+    def get_object(self):
+        # DRF instancia la vista por request: se resuelve el objeto una sola
+        # vez y se reutiliza para serializar, filtrar campos y auditar.
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    async def aget_object(self):
+        if not hasattr(self, "_object"):
+            self._object = await super().aget_object()
+        return self._object
 
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
-        self.log_audit("view", self.get_object())
+        self.log_audit("view", *self.retrieved())
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        response = await super().aretrieve(request, *args, **kwargs)
+        await self.alog_audit("view", *self.retrieved())
         return response
 
+    def retrieved(self):
+        """(instance, extra, object_id) para auditar un retrieve."""
+        if hasattr(self, "_object"):
+            return self._object, None, None
+        # Respuesta servida desde la cache: se audita por el pk de la URL
+        # sin volver a consultar el objeto.
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return None, None, int(lookup) if str(lookup).isdigit() else None
+
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
         self.log_audit("list")
         return response
 
+    async def alist(self, request, *args, **kwargs):
+        response = await super().alist(request, *args, **kwargs)
+        await self.alog_audit("list")
+        return response
+
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
         instance = getattr(self, "instance", None)
         self.log_audit("create", instance)
         return response
 
+    async def acreate(self, request, *args, **kwargs):
+        response = await super().acreate(request, *args, **kwargs)
+        await self.alog_audit("create", getattr(self, "instance", None))
+        return response
+
     def update(self, request, *args, **kwargs):
         response = super().update(request, *args, **kwargs)
         self.log_audit("update", self.get_object())
@@ -0,0 +1,104 @@
+from django.db import migrations
+from django.utils import timezone
+
+from apps.api.partitions import (
+    DEFAULT_PARTITION, TABLE, add_months, bounds_clause, month_start, partition_name,
+)
+
+# Months created ahead of the current one; later months are added by
+# `manage.py audit_partitions`.
+MONTHS_AHEAD = 3
+
+
+def table_definitions(cursor, table):
+    """Non primary key constraints and indexes of ``table``, as DDL."""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype <> 'p' ORDER BY conname",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass) "
+        "ORDER BY indexname",
+        [table, table],
+    )
+    indexes = [indexdef for (indexdef,) in cursor.fetchall()]
+    return constraints, indexes
+
+
+def partition_auditlog(apps, schema_editor):
+    # Declarative partitioning is PostgreSQL only; other backends keep the
+    # plain table.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    legacy = f'{TABLE}_legacy'
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes = table_definitions(cursor, TABLE)
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{legacy}") PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'SELECT MIN("timestamp"), MAX(id) FROM "{legacy}"')
+        oldest, last_id = cursor.fetchone()
+        month = month_start(oldest or timezone.now())
+        last_month = add_months(month_start(timezone.now()), MONTHS_AHEAD)
+        while month <= last_month:
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{TABLE}" {bounds_clause(month)}'
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        # Identity columns are not allowed on partitioned tables: use an
+        # owned sequence, which Django's sequence reset also understands.
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+        if last_id is not None:
+            cursor.execute(f'SELECT setval(\'"{TABLE}_id_seq"\', %s)', [last_id])
+
+        # Unique keys of a partitioned table must contain the partition key.
+        # The tenant is left out: id is already unique, and tenant queries
+        # use the (tenant, timestamp) index of each partition.
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, "timestamp")')
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def unpartition_auditlog(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    partitioned = f'{TABLE}_partitioned'
+    with schema_editor.connection.cursor() as cursor:
+        constraints, indexes = table_definitions(cursor, TABLE)
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{partitioned}"')
+        cursor.execute(f'ALTER INDEX "{TABLE}_pkey" RENAME TO "{partitioned}_pkey"')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{partitioned}")')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{partitioned}"')
+        cursor.execute(f'SELECT MAX(id) FROM "{TABLE}"')
+        (last_id,) = cursor.fetchone()
+        cursor.execute(f'DROP TABLE "{partitioned}" CASCADE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id)')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        if last_id is not None:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('\"{TABLE}\"', 'id'), %s)", [last_id])
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        for definition in indexes:
+            cursor.execute(definition.replace(' ON ONLY ', ' ON '))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_auditlog, unpartition_auditlog),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_counts(apps, schema_editor):
+    AuditLog = apps.get_model('api', 'AuditLog')
+    AuditDailyCount = apps.get_model('api', 'AuditDailyCount')
+    rows = (
+        AuditLog.objects.using(schema_editor.connection.alias)
+        .annotate(day=TruncDate('timestamp'))
+        .values('tenant_id', 'day', 'model', 'action')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    AuditDailyCount.objects.using(schema_editor.connection.alias).bulk_create(
+        (AuditDailyCount(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_partition_auditlog'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('model', models.CharField(max_length=100)),
+                ('action', models.CharField(max_length=20)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['tenant', 'user', 'timestamp', 'id'], name='auditlog_tenant_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['tenant', 'action', 'timestamp', 'id'], name='auditlog_tenant_action_ts_idx'),
+        ),
+        migrations.AddField(
+            model_name='auditdailycount',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenant.tenant'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditdailycount',
+            constraint=models.UniqueConstraint(fields=('tenant', 'day', 'model', 'action'), name='auditdailycount_key'),
+        ),
+        migrations.RunPython(backfill_daily_counts, migrations.RunPython.noop),
+    ]
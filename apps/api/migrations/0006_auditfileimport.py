@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_auditdailycount_and_audit_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditFileImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('rows', models.PositiveIntegerField()),
+                ('loaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
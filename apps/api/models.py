@@ -1,4 +1,6 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connections, models
 from django.utils import timezone
 from apps.tenant.models import Tenant
 
@@ -10,3 +12,85 @@ class AuditLog(models.Model):
     action = models.CharField(max_length=20)  # "view", "list", "create", "update", "delete"
     timestamp = models.DateTimeField(default=timezone.now)
     metadata = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        # On PostgreSQL the table is partitioned by month on timestamp
+        # (apps.api.partitions); the indexes exist in every partition.
+        indexes = [
+            models.Index(fields=['tenant', 'timestamp'], name='auditlog_tenant_ts_idx'),
+            models.Index(fields=['tenant', 'user', 'timestamp', 'id'], name='auditlog_tenant_user_ts_idx'),
+            models.Index(fields=['tenant', 'action', 'timestamp', 'id'], name='auditlog_tenant_action_ts_idx'),
+        ]
+
+
+class AuditDailyCountManager(models.Manager):
+    def add_events(self, events):
+        """
+        Adds audit events (dicts as queued by apps.api.audit) to the daily
+        counts with one INSERT ... ON CONFLICT DO UPDATE, so concurrent
+        writers increment the same rows without reading them first.
+        """
+        counts = Counter(
+            (event["tenant_id"], timezone.localdate(event["timestamp"]), event["model"], event["action"])
+            for event in events
+        )
+        if not counts:
+            return
+        table = self.model._meta.db_table
+        values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(counts))
+        params = [value for key, count in counts.items() for value in (*key, count)]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (tenant_id, day, model, action, count) VALUES {values} '
+                f'ON CONFLICT (tenant_id, day, model, action) '
+                f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                params,
+            )
+
+
+class AuditDailyCount(models.Model):
+    """
+    Audit events per tenant, day (in TIME_ZONE), model and action. Kept up
+    to date by the audit writer as it stores each batch, so dashboards read
+    a few rows per day instead of scanning the audit log.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    day = models.DateField()
+    model = models.CharField(max_length=100)
+    action = models.CharField(max_length=20)
+    count = models.PositiveBigIntegerField(default=0)
+
+    objects = AuditDailyCountManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'day', 'model', 'action'], name='auditdailycount_key'),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Marks a deleted patient or record so /sync/ endpoints can report the
+    deletion (see apps.api.sync), until ``manage.py purge_tombstones``. No FK
+    constraint on tenant: a deleted tenant's tombstones are dropped after it.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.DO_NOTHING, db_constraint=False)
+    model = models.CharField(max_length=100)  # model label, e.g. "records.record"
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'model', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+
+class AuditFileImport(models.Model):
+    """
+    Audit files (apps.api.sinks.JSONLFileSink) already imported by
+    ``manage.py load_audit_files``. Saved in the same transaction as the
+    rows, so a file is never loaded twice even if deleting it fails.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveIntegerField()
+    loaded_at = models.DateTimeField(default=timezone.now)
@@ -0,0 +1,135 @@
+import base64
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_after(ordering, position):
+    """
+    Q for rows strictly after ``position`` in ``ordering``, where fields
+    prefixed with ``-`` descend.
+    """
+    # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR ...
+    names = [field.lstrip('-') for field in ordering]
+    conditions = []
+    for i, field in enumerate(ordering):
+        equal = {f: v for f, v in zip(names[:i], position[:i])}
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        conditions.append(Q(**equal, **{f'{names[i]}__{lookup}': position[i]}))
+    return reduce(lambda a, b: a | b, conditions)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset (cursor) pagination.
+
+    Rows are ordered by ``ordering`` and the opaque cursor holds the values
+    of the last row served, so each page is a ``WHERE (a, b) > (x, y)`` range
+    scan instead of an OFFSET. The last field of ``ordering`` must be unique.
+    """
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.take_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.take_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """The page plus one row, to know whether there is a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset[:self.page_size + 1]
+
+    def take_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.position(rows[-1]) if self.has_next else None
+        return rows
+
+    def position(self, row):
+        # Rows are model instances, or dicts when the view paginates .values().
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def after(self, position):
+        return keyset_after(self.ordering, position)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        # isoformat() keeps microseconds; DjangoJSONEncoder would truncate
+        # them and make the cursor skip or repeat rows.
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in position]
+        data = json.dumps(values).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class RecordPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class AuditLogPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
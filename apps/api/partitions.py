@@ -0,0 +1,96 @@
+"""
+Monthly range partitions of the audit log table on PostgreSQL.
+
+Migration 0004 turns ``api_auditlog`` into a table partitioned by
+``timestamp``, with ``(id, timestamp)`` as primary key, one partition per
+month named ``api_auditlog_pYYYY_MM`` and a default partition that catches
+rows no monthly partition covers. Django keeps using the parent table, so
+AuditLog queries work unchanged and filters on ``timestamp`` only read the
+months they need. ``manage.py audit_partitions`` creates upcoming months
+and drops the expired ones.
+"""
+import re
+from datetime import date, datetime, timezone
+
+TABLE = 'api_auditlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def bounds_clause(month):
+    # DDL takes no query parameters; the bounds are ISO strings built here.
+    return f"FOR VALUES FROM ('{month_bound(month)}') TO ('{month_bound(add_months(month, 1))}')"
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+        [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def monthly_partitions(cursor):
+    """{first day of month: partition name} of the attached monthly partitions."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+        [TABLE],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(cursor, month):
+    """
+    Creates and attaches the partition of ``month``. Rows of that month
+    already stored in the default partition are moved into it first,
+    otherwise PostgreSQL refuses to attach it.
+    """
+    name = partition_name(month)
+    lower, upper = month_bound(month), month_bound(add_months(month, 1))
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [lower, upper],
+    )
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" {bounds_clause(month)}')
+    return name
+
+
+def drop_partition(cursor, name, detach_only=False):
+    cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+    if not detach_only:
+        cursor.execute(f'DROP TABLE "{name}"')
+
+
+def purge_default_partition(cursor, cutoff):
+    """Deletes rows older than ``cutoff`` that ended up in the default partition."""
+    cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" < %s', [month_bound(cutoff)])
+    return cursor.rowcount
@@ -0,0 +1,9 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsPremiumTenant(BasePermission):
+    message = 'Only available for premium tenants.'
+
+    def has_permission(self, request, view):
+        tenant = getattr(request, 'tenant', None)
+        return bool(tenant and tenant.premium)
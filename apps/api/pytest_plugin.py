@@ -0,0 +1,200 @@
+"""
+pytest plugin, loaded by the root conftest.py, that checks the SQL every
+request made by a test runs:
+
+- a request running more queries than the ``query_budget`` its viewset
+  declares for the action (apps.api.views) fails the test;
+- identical queries (same SQL and parameters) run more than once in one
+  request, and the same SQL run ``--query-repeat`` times or more with
+  different parameters (the shape of an N+1), are listed at the end of the
+  run. ``--strict-queries`` makes them fail the test as well;
+- ``--query-report`` prints the most queries seen per endpoint, to set or
+  tighten budgets.
+
+Queries are recorded between Django's request_started and request_finished
+signals, so test setup is not counted. SAVEPOINT statements are skipped:
+they only exist because tests run inside a transaction.
+Mark a test with ``@pytest.mark.no_query_checks`` to leave it out.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+import pytest
+
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('api-queries', 'API query checks (apps.api.pytest_plugin)')
+    group.addoption(
+        '--strict-queries', action='store_true',
+        help='Fail tests whose requests repeat queries, not only the ones over budget.'
+    )
+    group.addoption(
+        '--query-repeat', type=int, default=3,
+        help='Runs of the same SQL with different parameters in one request reported as N+1 (default 3).'
+    )
+    group.addoption('--query-report', action='store_true', help='Print the most queries seen per endpoint.')
+    group.addoption('--no-query-checks', action='store_true', help='Do not record queries at all.')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "no_query_checks: don't check the queries of this test's requests")
+    if not config.getoption('no_query_checks'):
+        config.pluginmanager.register(QueryChecks(config), 'api-query-checks')
+
+
+def describe_endpoint(method, path):
+    """(view name, viewset action, query budget) of the request, as far as known."""
+    from django.urls import Resolver404, resolve
+
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None, None, None
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    budgets = getattr(getattr(match.func, 'cls', None), 'query_budget', None) or {}
+    return match.view_name, action, budgets.get(action)
+
+
+@dataclass
+class RequestQueries:
+    method: str
+    path: str
+    view: str = None
+    action: str = None
+    budget: int = None
+    queries: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.view, self.action, self.budget = describe_endpoint(self.method, self.path)
+
+    @property
+    def label(self):
+        return f'{self.method} {self.path} ({self.view or "unresolved"}{":" + self.action if self.action else ""})'
+
+    def duplicates(self):
+        return [(sql, count) for (sql, _), count in Counter(self.queries).items() if count > 1]
+
+    def repeated(self, threshold):
+        params = defaultdict(set)
+        for sql, key in self.queries:
+            params[sql].add(key)
+        shapes = Counter(sql for sql, _ in self.queries)
+        return [
+            (sql, count) for sql, count in shapes.items()
+            if count >= threshold and len(params[sql]) > 1
+        ]
+
+
+class RequestRecorder:
+    """Execute wrapper and request signal receivers collecting RequestQueries."""
+
+    def __init__(self):
+        self.requests = []
+        self._local = threading.local()
+
+    def started(self, sender, environ=None, scope=None, **kwargs):
+        if environ is not None:
+            method, path = environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', '')
+        else:
+            method, path = (scope or {}).get('method', 'GET'), (scope or {}).get('path', '')
+        self._local.current = RequestQueries(method, path)
+
+    def finished(self, sender, **kwargs):
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            self.requests.append(current)
+            self._local.current = None
+
+    def __call__(self, execute, sql, params, many, context):
+        current = getattr(self._local, 'current', None)
+        if current is not None and not sql.lstrip().upper().startswith(SAVEPOINT_PREFIXES):
+            current.queries.append((sql, repr(params)))
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self):
+        from django.core.signals import request_finished, request_started
+        from django.db import connections
+
+        request_started.connect(self.started)
+        request_finished.connect(self.finished)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                yield self
+        finally:
+            request_started.disconnect(self.started)
+            request_finished.disconnect(self.finished)
+
+
+def format_queries(title, entries):
+    return [title, *(f'    {count}x {sql}' for sql, count in entries)]
+
+
+class QueryChecks:
+    def __init__(self, config):
+        self.strict = config.getoption('strict_queries')
+        self.repeat = config.getoption('query_repeat')
+        self.report = config.getoption('query_report')
+        self.findings = []
+        self.endpoints = {}
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_call(self, item):
+        from django.conf import settings
+
+        if not settings.configured or item.get_closest_marker('no_query_checks'):
+            return (yield)
+        recorder = RequestRecorder()
+        with recorder.installed():
+            result = yield
+
+        failures = []
+        for request in recorder.requests:
+            self.count(request)
+            if request.budget is not None and len(request.queries) > request.budget:
+                failures.append(
+                    f'{request.label} ran {len(request.queries)} queries, budget is {request.budget}:\n'
+                    + '\n'.join(f'    {sql}' for sql, _ in request.queries)
+                )
+            lines = []
+            if request.duplicates():
+                lines += format_queries('  duplicate queries:', request.duplicates())
+            if request.repeated(self.repeat):
+                lines += format_queries('  repeated per-row queries (N+1?):', request.repeated(self.repeat))
+            if lines:
+                self.findings.append([f'{item.nodeid}: {request.label}', *lines])
+                if self.strict:
+                    failures.append('\n'.join([request.label, *lines]))
+        if failures:
+            pytest.fail('\n'.join(failures), pytrace=False)
+        return result
+
+    def count(self, request):
+        if request.view is None:
+            return
+        key = (request.view, request.action)
+        seen = self.endpoints.setdefault(key, [0, 0, request.budget])
+        seen[0] = max(seen[0], len(request.queries))
+        seen[1] += 1
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.findings:
+            terminalreporter.section('repeated queries')
+            for lines in self.findings:
+                for line in lines:
+                    terminalreporter.write_line(line)
+        if self.report and self.endpoints:
+            terminalreporter.section('queries per endpoint')
+            terminalreporter.write_line(f"{'endpoint':<40} {'requests':>8} {'max':>5} {'budget':>6}")
+            for (view, action), (most, requests, budget) in sorted(self.endpoints.items()):
+                name = f'{view}:{action}' if action else view
+                terminalreporter.write_line(
+                    f"{name:<40} {requests:>8} {most:>5} {'-' if budget is None else budget:>6}"
+                )
@@ -0,0 +1,182 @@
+"""
+Destinations for the batches of the audit writer (apps.api.audit), picked
+with AUDIT_LOG['SINK'] and built with AUDIT_LOG['SINK_OPTIONS'] as keyword
+arguments.
+
+- DatabaseSink writes AuditLog rows and the daily rollup directly.
+- JSONLFileSink appends events to local JSON lines files, keeping audit
+  volume off the primary database; ``manage.py load_audit_files`` imports
+  the rotated files later with COPY.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+CURRENT_SUFFIX = ".current.jsonl"
+ROTATED_SUFFIX = ".jsonl"
+
+
+class AuditSink:
+    """Receives batches of audit events (dicts of AuditLog field values)."""
+
+    def write(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DatabaseSink(AuditSink):
+    def write(self, events):
+        from .models import AuditDailyCount, AuditLog
+
+        with transaction.atomic():
+            AuditLog.objects.bulk_create([AuditLog(**event) for event in events])
+            AuditDailyCount.objects.add_events(events)
+
+
+def event_line(event):
+    # isoformat() keeps microseconds, DjangoJSONEncoder would cut them.
+    return json.dumps(
+        {**event, "timestamp": event["timestamp"].isoformat()},
+        cls=DjangoJSONEncoder, separators=(",", ":"),
+    ) + "\n"
+
+
+class JSONLFileSink(AuditSink):
+    """
+    Appends one JSON line per event to ``<directory>/audit-<host>-<pid>``
+    + ``.current.jsonl``. Every batch is written with one write() and made
+    durable with one fsync, so the cost of fsync is paid per batch and not
+    per event.
+
+    Once the file passes ``max_bytes`` (and when the sink is closed) it is
+    renamed to ``audit-<host>-<pid>-<utc timestamp>.jsonl``: only rotated
+    files are complete and ready for ``load_audit_files``. Each process
+    writes its own file, so workers never interleave lines. The current
+    files of processes that died without closing the sink are rotated by
+    rotate_orphaned_files(), when a sink opens its file and before
+    ``load_audit_files`` imports.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, fsync=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    @property
+    def prefix(self):
+        return os.path.join(self.directory, f"audit-{socket.gethostname()}-{os.getpid()}")
+
+    def _open(self):
+        if self._file is not None and self._pid == os.getpid():
+            return self._file
+        # First write, or a forked worker holding its parent's file.
+        os.makedirs(self.directory, exist_ok=True)
+        rotate_orphaned_files(self.directory)
+        self._pid = os.getpid()
+        self._file = open(self.prefix + CURRENT_SUFFIX, "a", encoding="utf-8")
+        return self._file
+
+    def write(self, events):
+        data = "".join(event_line(event) for event in events)
+        with self._lock:
+            handle = self._open()
+            handle.write(data)
+            handle.flush()
+            if self.fsync:
+                os.fsync(handle.fileno())
+            if handle.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        rotate(self.prefix)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._rotate()
+
+
+def rotate(prefix):
+    """Renames ``<prefix>.current.jsonl`` to ``<prefix>-<utc timestamp>.jsonl``."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    os.rename(prefix + CURRENT_SUFFIX, f"{prefix}-{stamp}{ROTATED_SUFFIX}")
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def rotate_orphaned_files(directory, stale_after=None):
+    """
+    Rotates the current files left by writers that are gone, so their
+    events get imported: files of this host whose pid no longer exists and,
+    with ``stale_after``, files of any host not written to for that many
+    seconds. Returns the prefixes rotated.
+    """
+    if not os.path.isdir(directory):
+        return []
+    hostname = socket.gethostname()
+    rotated = []
+    for name in os.listdir(directory):
+        if not (name.startswith("audit-") and name.endswith(CURRENT_SUFFIX)):
+            continue
+        prefix = os.path.join(directory, name[:-len(CURRENT_SUFFIX)])
+        host, _, pid = name[len("audit-"):-len(CURRENT_SUFFIX)].rpartition("-")
+        try:
+            if host == hostname and pid.isdigit():
+                orphaned = not process_exists(int(pid))
+            else:
+                orphaned = False
+            if not orphaned and stale_after is not None:
+                orphaned = time.time() - os.path.getmtime(prefix + CURRENT_SUFFIX) > stale_after
+            if orphaned:
+                rotate(prefix)
+                rotated.append(prefix)
+        except FileNotFoundError:
+            # Rotated meanwhile by its writer or another process.
+            continue
+    return rotated
+
+
+def rotated_files(directory):
+    """Rotated (complete) audit files in ``directory``, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = (
+        name for name in os.listdir(directory)
+        if name.startswith("audit-") and name.endswith(ROTATED_SUFFIX)
+        and not name.endswith(CURRENT_SUFFIX)
+    )
+    return sorted((os.path.join(directory, name) for name in names), key=lambda path: (os.path.getmtime(path), path))
+
+
+def read_events(path):
+    """
+    Yields the events of an audit file with their timestamps parsed back.
+    A last line without newline, cut by a writer that died, is skipped.
+    """
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip() and line.endswith("\n"):
+                event = json.loads(line)
+                event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+                yield event
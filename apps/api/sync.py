@@ -0,0 +1,222 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record, records_deleting
+from apps.tenant.models import Tenant
+
+from .models import Tombstone
+from .pagination import keyset_after
+
+SYNC_TOKEN_SALT = 'apps.api.sync'
+CHANGES_ORDERING = ('updated_at', 'id')
+TOMBSTONES_ORDERING = ('deleted_at', 'id')
+
+
+def encode_position(position):
+    return None if position is None else [position[0].isoformat(), position[1]]
+
+
+def decode_position(value):
+    if value is None:
+        return None
+    moment, pk = value
+    return [parse_moment(moment), int(pk)]
+
+
+def parse_moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return moment
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Sync token expired, start a full sync without one.'
+    default_code = 'full_resync'
+
+
+def sync_cutoff():
+    """
+    Tokens that may still need tombstones older than this are expired, and
+    ``manage.py purge_tombstones`` deletes those tombstones.
+    """
+    return timezone.now() - timedelta(days=getattr(settings, 'API_SYNC_TOKEN_MAX_AGE_DAYS', 30))
+
+
+def dump_sync_token(tenant, stream, since, floor, changes, deletions):
+    return signing.dumps({
+        'tenant': tenant.pk,
+        'stream': stream,
+        'since': since.isoformat() if since else None,
+        'floor': floor.isoformat(),
+        'changes': encode_position(changes),
+        'deletions': encode_position(deletions),
+    }, salt=SYNC_TOKEN_SALT, compress=True)
+
+
+def load_sync_token(token, tenant, stream):
+    """
+    Returns the (since, floor, changes, deletions) state of a token issued
+    for this tenant and stream. A token issued for another stream, e.g.
+    after the tenant switched its record type, is rejected so the client
+    resyncs. So is a token whose floor, the horizon before which it needs no
+    tombstones, is past sync_cutoff(): those tombstones may be purged.
+    """
+    try:
+        payload = signing.loads(token, salt=SYNC_TOKEN_SALT)
+        if payload['tenant'] != tenant.pk or payload['stream'] != stream:
+            raise ValueError
+        since = parse_moment(payload['since']) if payload['since'] else None
+        floor = parse_moment(payload['floor'])
+        changes, deletions = decode_position(payload['changes']), decode_position(payload['deletions'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValidationError({'token': 'Invalid sync token, start a full sync without one.'})
+    if floor < sync_cutoff():
+        raise SyncTokenExpired()
+    return since, floor, changes, deletions
+
+
+def sync_response(request, queryset, serializer_class, context):
+    """
+    One page of changes since ``?token=`` for a tenant-scoped queryset:
+    rows created or updated (by updated_at, id) and ids deleted (tombstones),
+    each stream read with a keyset on its own index, so a sync costs what
+    changed rather than what the tenant holds.
+
+    Without a token the client gets every row and no deletions. A token
+    older than API_SYNC_TOKEN_MAX_AGE_DAYS gets a 410 (SyncTokenExpired)
+    instead, as its deletions may be purged. Rows newer
+    than API_SYNC_SETTLE_SECONDS are held back to the next sync: a
+    transaction still in flight may commit rows with an older updated_at,
+    and the keyset would skip them once past.
+    """
+    tenant = request.tenant
+    model = queryset.model
+    stream = model._meta.label_lower
+    page_size = getattr(settings, 'API_SYNC_PAGE_SIZE', 500)
+    horizon = timezone.now() - timedelta(seconds=getattr(settings, 'API_SYNC_SETTLE_SECONDS', 5))
+    tombstones = Tombstone.objects.filter(tenant=tenant, model=stream, deleted_at__lte=horizon)
+
+    token = request.query_params.get('token')
+    if token:
+        since, floor, changes_position, deletions_position = load_sync_token(token, tenant, stream)
+    else:
+        # A new client has nothing to delete: start after the last tombstone.
+        since = changes_position = None
+        floor = horizon
+        last = tombstones.order_by('-deleted_at', '-id').values_list(*TOMBSTONES_ORDERING).first()
+        deletions_position = list(last) if last else None
+
+    changed = queryset.filter(updated_at__lte=horizon).order_by(*CHANGES_ORDERING)
+    if changes_position is not None:
+        changed = changed.filter(keyset_after(CHANGES_ORDERING, changes_position))
+    changed = list(changed[:page_size + 1])
+
+    if deletions_position is not None:
+        tombstones = tombstones.filter(keyset_after(TOMBSTONES_ORDERING, deletions_position))
+    deleted = list(
+        tombstones.order_by(*TOMBSTONES_ORDERING).values_list('deleted_at', 'id', 'object_id')[:page_size + 1]
+    )
+
+    has_more = len(changed) > page_size or len(deleted) > page_size
+    changed, deleted = changed[:page_size], deleted[:page_size]
+    if changed:
+        changes_position = [changed[-1].updated_at, changed[-1].pk]
+    if deleted:
+        deletions_position = list(deleted[-1][:2])
+
+    # ``since`` is the horizon of the client's last complete sync: rows
+    # created after it are new to the client, the rest are updates.
+    serializer = serializer_class(context=context)
+    created, updated = [], []
+    for row in changed:
+        is_new = since is None or row.created_at > since
+        (created if is_new else updated).append(serializer.to_representation(row))
+
+    # ``floor`` is the horizon the client's current sync started from: the
+    # tombstones it may still need are newer.
+    return Response({
+        'created': created,
+        'updated': updated,
+        'deleted': [object_id for _, _, object_id in deleted],
+        'has_more': has_more,
+        'next_token': dump_sync_token(
+            tenant, stream, since if has_more else horizon, floor if has_more else horizon,
+            changes_position, deletions_position,
+        ),
+    })
+
+
+def tombstones_for(queryset, tenant_id=None):
+    """
+    Unsaved tombstones for the rows of ``queryset``, read in one query, in
+    each row's tenant or in ``tenant_id`` when given.
+    """
+    model = queryset.model._meta.label_lower
+    return [
+        Tombstone(tenant_id=tenant_id or row_tenant_id, model=model, object_id=pk)
+        for pk, row_tenant_id in queryset.values_list('pk', 'tenant_id')
+        if tenant_id or row_tenant_id
+    ]
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Record)
+@receiver(post_save, sender=FlexibleRecord)
+def _tombstone_previous_tenant(sender, instance, created, raw, **kwargs):
+    """
+    A row moved to another tenant is deleted for the previous one. A patient
+    takes its records along (apps.records.models), so they get tombstones
+    there too, in one INSERT.
+    """
+    previous = getattr(instance, '_loaded_tenant_id', None)
+    if created or raw or previous is None or previous == instance.tenant_id:
+        return
+    tombstones = [Tombstone(tenant_id=previous, model=sender._meta.label_lower, object_id=instance.pk)]
+    if sender is Patient:
+        for model in (Record, FlexibleRecord):
+            tombstones += tombstones_for(model.objects.filter(patient=instance), tenant_id=previous)
+    Tombstone.objects.bulk_create(tombstones)
+
+
+def _deletes_tenant(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, Tenant)
+
+
+@receiver(pre_delete, sender=Patient)
+def _tombstone_patient(sender, instance, origin=None, **kwargs):
+    """
+    Tombstones for a deleted patient and the records its delete cascades
+    to, in one INSERT. Records have no delete receivers, so Django still
+    removes them with one fast DELETE. Nothing is written when the whole
+    tenant goes: its tombstones go with it.
+    """
+    if instance.tenant_id is None or _deletes_tenant(origin):
+        return
+    tombstones = [Tombstone(tenant_id=instance.tenant_id, model=sender._meta.label_lower, object_id=instance.pk)]
+    for model in (Record, FlexibleRecord):
+        tombstones += tombstones_for(model.objects.filter(patient=instance))
+    Tombstone.objects.bulk_create(tombstones)
+
+
+@receiver(records_deleting)
+def _tombstone_records(sender, queryset, **kwargs):
+    Tombstone.objects.bulk_create(tombstones_for(queryset))
+
+
+@receiver(post_delete, sender=Tenant)
+def _drop_tenant_tombstones(sender, instance, **kwargs):
+    Tombstone.objects.filter(tenant_id=instance.pk).delete()
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FETCH_METHODS = ('fetchone', 'fetchmany', 'fetchall')
+
+
+class QueryRecorder:
+    """
+    Execute wrapper recording the SQL run on a connection and how many rows
+    were fetched back from it, to check what an endpoint costs.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries.append(sql)
+        self._count_rows(context['cursor'])
+        return result
+
+    def _count_rows(self, cursor):
+        if getattr(cursor, '_rows_recorder', None) is self:
+            return
+        cursor._rows_recorder = self
+        for name in FETCH_METHODS:
+            setattr(cursor, name, self._counting(getattr(cursor, name)))
+
+    def _counting(self, fetch):
+        def wrapper(*args, **kwargs):
+            result = fetch(*args, **kwargs)
+            if isinstance(result, tuple):
+                self.rows += 1
+            elif result:
+                self.rows += len(result)
+            return result
+        return wrapper
+
+    def summary(self):
+        lines = [f'{len(self.queries)} queries, {self.rows} rows:']
+        lines.extend(f'{index}. {sql}' for index, sql in enumerate(self.queries, start=1))
+        return '\n'.join(lines)
+
+
+class EndpointCostMixin:
+    """
+    TestCase mixin with assertEndpointCost, a guardrail against queries that
+    grow with the database: besides the number of queries it checks the rows
+    read, which stay bounded only while every query is tenant-scoped.
+    """
+
+    @contextmanager
+    def assertEndpointCost(self, queries, rows=None, using=DEFAULT_DB_ALIAS):
+        recorder = QueryRecorder()
+        with connections[using].execute_wrapper(recorder):
+            yield recorder
+        self.assertEqual(len(recorder.queries), queries, recorder.summary())
+        if rows is not None:
+            self.assertEqual(recorder.rows, rows, recorder.summary())
@@ -0,0 +1,131 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.views import TokenObtainPairView
+from apps.api.async_views import async_urlpatterns
+from apps.api.models import AuditLog
+from apps.api.urls import router
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+
+# The API with API_ASYNC_VIEWS on, as ROOT_URLCONF of the async requests.
+urlpatterns = [
+    path('api/', include(async_urlpatterns(router.urls))),
+    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+]
+
+
+@override_settings(AUDIT_LOG={"ASYNC": False})
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(
+            name="Async", type="clinic", premium=True, allow_partial_patients=True,
+            patient_visible_fields=["id", "email", "first_name", "updated_at"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        self.patients = [
+            Patient.objects.create(tenant=self.tenant, first_name=f"Async {i}", email=f"async{i}@example.com")
+            for i in range(3)
+        ]
+        for patient in self.patients:
+            FlexibleRecord.objects.create(
+                patient=patient, tenant=self.tenant, record_type="Vitals", data={"bpm": 70}
+            )
+        user = User.objects.create_user(username="async", password="asyncpass")
+        UserProfile.objects.create(user=user, tenant=self.tenant)
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {"username": "async", "password": "asyncpass"}, format="json")
+        self.auth = {"Authorization": f'Bearer {response.data["access"]}'}
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth["Authorization"])
+
+    async def async_get(self, url, **headers):
+        with self.settings(ROOT_URLCONF=__name__):
+            return await self.async_client.get(url, headers={**self.auth, **headers})
+
+    async def assertSameAsSync(self, url):
+        expected = await sync_to_async(self.client.get)(url)
+        response = await self.async_get(url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in ("Content-Type", "ETag", "Last-Modified", "Allow", "Vary"):
+            self.assertEqual(response.get(header), expected.get(header), header)
+        return response
+
+    async def test_list_and_retrieve_match_the_sync_views(self):
+        for fast in (False, True):
+            with self.settings(API_FAST_LIST_SERIALIZATION=fast, API_RESPONSE_CACHE=None):
+                response = await self.assertSameAsSync(reverse("patient-list") + "?page_size=2")
+                await self.assertSameAsSync(response.json()["next"])
+                await self.assertSameAsSync(reverse("patient-list") + "?expand=records")
+                await self.assertSameAsSync(reverse("record-list") + "?data.bpm=70")
+                await self.assertSameAsSync(reverse("patient-detail", args=[self.patients[0].pk]))
+                await self.assertSameAsSync(reverse("record-detail", args=[0]))
+                await self.assertSameAsSync(reverse("patient-detail", args=["nope"]))
+
+    @override_settings(API_RESPONSE_CACHE='api')
+    async def test_response_cache_and_conditional_requests(self):
+        url = reverse("patient-detail", args=[self.patients[1].pk])
+        first = await self.async_get(url)
+        second = await self.async_get(url)
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        not_modified = await self.async_get(url, if_none_match=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_create(self):
+        with self.settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.post(
+                reverse("record-list"), {"patient": self.patients[0].pk, "record_type": "Lab", "data": {"test": "hba1c"}},
+                content_type="application/json", headers=self.auth,
+            )
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertTrue(await FlexibleRecord.objects.filter(pk=response.json()["id"], tenant=self.tenant).aexists())
+
+            other = await Patient.objects.acreate(email="async-other@example.com")
+            response = await self.async_client.post(
+                reverse("record-list"), {"patient": other.pk, "record_type": "Lab", "data": {}},
+                content_type="application/json", headers=self.auth,
+            )
+            self.assertEqual(response.status_code, 404)
+
+            response = await self.async_client.post(
+                reverse("patient-list"), {"email": self.patients[0].email},
+                content_type="application/json", headers=self.auth,
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("email", response.json())
+
+            other_tenant = await Tenant.objects.acreate(name="Async other", type="clinic")
+            response = await self.async_client.post(
+                reverse("patient-list"), {"email": "async-new@example.com", "tenant": other_tenant.pk},
+                content_type="application/json", headers=self.auth,
+            )
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual((await Patient.objects.aget(email="async-new@example.com")).tenant_id, self.tenant.pk)
+
+    async def test_actions_are_audited(self):
+        await self.async_get(reverse("patient-list"))
+        await self.async_get(reverse("patient-detail", args=[self.patients[0].pk]))
+        actions = [log.action async for log in AuditLog.objects.filter(tenant=self.tenant).order_by("id")]
+        self.assertEqual(actions, ["list", "view"])
+
+    async def test_other_requests_use_the_sync_views(self):
+        html = await self.async_get(reverse("patient-list"), accept="text/html")
+        self.assertEqual(html.status_code, 200)
+        self.assertTrue(html["Content-Type"].startswith("text/html"))
+        with self.settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.patch(
+                reverse("patient-detail", args=[self.patients[2].pk]), {"first_name": "Patched", "email": self.patients[2].email},
+                content_type="application/json", headers=self.auth,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((await Patient.objects.aget(pk=self.patients[2].pk)).first_name, "Patched")
+
+    async def test_invalid_token_is_rejected_by_the_async_middleware(self):
+        with self.settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(reverse("patient-list"), headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Server-Timing", response)
@@ -0,0 +1,250 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.api.audit import AuditLogWriter, DROP, SYNC
+from apps.api.models import AuditDailyCount, AuditFileImport, AuditLog
+from apps.api.sinks import CURRENT_SUFFIX, JSONLFileSink, event_line, read_events, rotated_files
+from apps.patients.models import Patient
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+from django.contrib.auth.models import User
+
+
+def make_event(tenant, action="view"):
+    return {
+        "tenant_id": tenant.pk,
+        "user_id": None,
+        "model": "Patient",
+        "object_id": None,
+        "action": action,
+        "timestamp": timezone.now(),
+        "metadata": {},
+    }
+
+
+class TestAuditMixin(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_token(self, username, password):
+        response = self.client.post('/api/token/', {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    @override_settings(AUDIT_LOG={"ASYNC": False})
+    def test_premium_list_is_audited(self):
+        tenant = Tenant.objects.create(
+            name="Premium", type="hospital", premium=True,
+            patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="premiumuser", password="premiumpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("premiumuser", "premiumpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("record-list"))
+        self.assertEqual(response.status_code, 200)
+        log = AuditLog.objects.get(tenant=tenant)
+        self.assertEqual(log.action, "list")
+        self.assertEqual(log.model, "Record")
+        self.assertEqual(log.user, user)
+
+    @override_settings(AUDIT_LOG={"ASYNC": False}, API_RESPONSE_CACHE='api')
+    def test_cached_retrieve_is_still_audited(self):
+        tenant = Tenant.objects.create(
+            name="PremiumCache", type="hospital", premium=True,
+            patient_visible_fields=["email"], patient_records_type=Tenant.RIGID
+        )
+        patient = Patient.objects.create(tenant=tenant, email="audited@example.com")
+        user = User.objects.create_user(username="premiumcache", password="premiumpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("premiumcache", "premiumpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        logs = AuditLog.objects.filter(tenant=tenant, action="view")
+        self.assertEqual([log.object_id for log in logs], [patient.pk, patient.pk])
+        self.assertEqual({log.model for log in logs}, {"Patient"})
+
+    def test_queue_full_drop_policy(self):
+        tenant = Tenant.objects.create(name="Drop", type="clinic")
+        writer = AuditLogWriter(queue_size=1, backpressure=DROP)
+        writer._ensure_started = lambda: None
+        writer.submit(make_event(tenant))
+        writer.submit(make_event(tenant))
+        self.assertEqual(writer.dropped, 1)
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+    def test_queue_full_sync_policy(self):
+        tenant = Tenant.objects.create(name="Sync", type="clinic")
+        writer = AuditLogWriter(queue_size=1, backpressure=SYNC)
+        writer._ensure_started = lambda: None
+        writer.submit(make_event(tenant))
+        writer.submit(make_event(tenant, action="list"))
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(list(AuditLog.objects.values_list("action", flat=True)), ["list"])
+
+
+@override_settings(AUDIT_LOG={"ASYNC": False})
+class TestAuditLogAPI(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_token(self, username, password):
+        response = self.client.post('/api/token/', {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def login(self, premium):
+        tenant = Tenant.objects.create(
+            name="Compliance", type="hospital", premium=premium,
+            patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username=f"compliance{premium}", password="compliancepass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token(f"compliance{premium}", "compliancepass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return tenant, user
+
+    def test_requires_premium_tenant(self):
+        self.login(premium=False)
+        self.assertEqual(self.client.get(reverse("auditlog-list")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("auditlog-daily")).status_code, 403)
+
+    def test_search_newest_first_with_keyset_pages(self):
+        tenant, user = self.login(premium=True)
+        other = Tenant.objects.create(name="Other", type="clinic", premium=True)
+        start = timezone.now() - timedelta(days=3)
+        AuditLog.objects.bulk_create([
+            AuditLog(tenant=tenant, user=user if i % 2 else None, model="Patient", object_id=i,
+                     action="view", timestamp=start + timedelta(hours=min(i, 3)))
+            for i in range(6)
+        ] + [AuditLog(tenant=other, model="Patient", action="view", timestamp=start)])
+        seen = []
+        url = reverse("auditlog-list") + "?model=Patient&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["object_id"] for row in response.data["results"])
+            url = response.data["next"]
+        # Rows 3, 4 and 5 share a timestamp and are ordered by id.
+        self.assertEqual(seen, [5, 4, 3, 2, 1, 0])
+
+        response = self.client.get(reverse("auditlog-list"), {
+            "model": "Patient", "user": user.pk, "timestamp_before": (start + timedelta(hours=3)).isoformat()
+        })
+        self.assertEqual([row["object_id"] for row in response.data["results"]], [1])
+        self.assertEqual(self.client.get(reverse("auditlog-list"), {"user": "me"}).status_code, 400)
+
+    def test_daily_counts_are_rolled_up_by_the_writer(self):
+        tenant, _ = self.login(premium=True)
+        writer = AuditLogWriter(run_async=False)
+        writer.submit(make_event(tenant))
+        writer.submit(make_event(tenant))
+        writer.submit(make_event(tenant, action="list"))
+        self.assertEqual(
+            AuditDailyCount.objects.get(tenant=tenant, action="view", day=timezone.localdate()).count, 2
+        )
+        response = self.client.get(reverse("auditlog-daily"), {"model": "Patient", "day_after": timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row["action"], row["count"]) for row in response.data],
+            [("list", 1), ("view", 2)]
+        )
+        self.assertEqual(self.client.get(reverse("auditlog-daily"), {"day_after": "yesterday"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("auditlog-daily"), {"day_after": "2020-13-01"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("auditlog-list"), {"timestamp_after": "2020-13-01"}).status_code, 400)
+
+
+class TestAuditLogWriter(TransactionTestCase):
+    def test_events_are_written_in_batches(self):
+        tenant = Tenant.objects.create(name="Batch", type="clinic")
+        writer = AuditLogWriter(batch_size=2, flush_interval=60)
+        for _ in range(5):
+            writer.submit(make_event(tenant))
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(AuditLog.objects.filter(tenant=tenant).count(), 5)
+        writer.close()
+
+    def test_close_writes_pending_events(self):
+        tenant = Tenant.objects.create(name="Close", type="clinic")
+        writer = AuditLogWriter(batch_size=100, flush_interval=60)
+        for _ in range(3):
+            writer.submit(make_event(tenant))
+        writer.close()
+        self.assertEqual(AuditLog.objects.filter(tenant=tenant).count(), 3)
+        writer.submit(make_event(tenant))
+        self.assertEqual(AuditLog.objects.filter(tenant=tenant).count(), 4)
+
+
+class TestAuditFileSink(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.tenant = Tenant.objects.create(name="Files", type="clinic")
+
+    def test_rotates_by_size_and_on_close(self):
+        sink = JSONLFileSink(self.directory.name, max_bytes=300)
+        writer = AuditLogWriter(run_async=False, sink=sink)
+        events = [make_event(self.tenant) for _ in range(5)]
+        for event in events:
+            writer.submit(event)
+        self.assertEqual(len(rotated_files(self.directory.name)), 1)
+        self.assertTrue(os.path.exists(sink.prefix + CURRENT_SUFFIX))
+        writer.close()
+        self.assertFalse(os.path.exists(sink.prefix + CURRENT_SUFFIX))
+        files = rotated_files(self.directory.name)
+        self.assertEqual(len(files), 2)
+        self.assertEqual([event for path in files for event in read_events(path)], events)
+        self.assertFalse(AuditLog.objects.filter(tenant=self.tenant).exists())
+
+    def test_load_audit_files_imports_each_file_once(self):
+        sink = JSONLFileSink(self.directory.name)
+        sink.write([make_event(self.tenant, "view"), make_event(self.tenant, "update")])
+        sink.write([make_event(self.tenant, "view")])
+        sink.close()
+        call_command("load_audit_files", self.directory.name, keep=True, stdout=StringIO())
+        self.assertEqual(AuditLog.objects.filter(tenant=self.tenant).count(), 3)
+        self.assertEqual(
+            dict(AuditDailyCount.objects.filter(tenant=self.tenant).values_list("action", "count")),
+            {"view": 2, "update": 1},
+        )
+        self.assertEqual(AuditFileImport.objects.get().rows, 3)
+
+        out = StringIO()
+        call_command("load_audit_files", self.directory.name, stdout=out)
+        self.assertIn("already loaded", out.getvalue())
+        self.assertEqual(AuditLog.objects.filter(tenant=self.tenant).count(), 3)
+        self.assertEqual(rotated_files(self.directory.name), [])
+
+    def test_files_of_dead_writers_are_imported(self):
+        # A writer killed mid-batch: its current file is never rotated and
+        # may end with a partial line.
+        process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        dead = os.path.join(self.directory.name, f"audit-{socket.gethostname()}-{int(process.stdout)}")
+        events = [make_event(self.tenant), make_event(self.tenant, "update")]
+        with open(dead + CURRENT_SUFFIX, "w") as handle:
+            handle.write("".join(event_line(event) for event in events) + '{"tenant_id":')
+        live = JSONLFileSink(self.directory.name)
+        live.write([make_event(self.tenant)])
+
+        call_command("load_audit_files", self.directory.name, stdout=StringIO())
+        self.assertEqual(
+            sorted(AuditLog.objects.filter(tenant=self.tenant).values_list("action", flat=True)), ["update", "view"]
+        )
+        self.assertFalse(os.path.exists(dead + CURRENT_SUFFIX))
+        self.assertTrue(os.path.exists(live.prefix + CURRENT_SUFFIX))
+
+        os.utime(live.prefix + CURRENT_SUFFIX, (0, 0))
+        call_command("load_audit_files", self.directory.name, stale_after=3600, stdout=StringIO())
+        self.assertEqual(AuditLog.objects.filter(tenant=self.tenant).count(), 3)
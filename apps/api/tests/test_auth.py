@@ -0,0 +1,167 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.checks import run_checks
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from apps.api.testing import EndpointCostMixin
+from apps.patients.models import Patient
+from apps.tenant.authentication import CachedJWTAuthentication, resolve_tenant
+from apps.tenant.cache import principal_cache, tenant_cache
+from apps.tenant.decorators import tenant_required
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+
+
+@override_settings(API_RESPONSE_CACHE=None, JWT_STATELESS_AUTH=True)
+class TestStatelessTokens(EndpointCostMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        principal_cache.clear()
+        tenant_cache.clear()
+        self.tenant = Tenant.objects.create(
+            name="Stateless", type="clinic",
+            patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        Patient.objects.create(tenant=self.tenant, email="stateless@example.com")
+        self.user = User.objects.create_user(username="stateless", password="statelesspass")
+        UserProfile.objects.create(user=self.user, tenant=self.tenant)
+
+    def get_token(self, username, password):
+        response = self.client.post('/api/token/', {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def login(self):
+        token = self.get_token("stateless", "statelesspass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return token
+
+    def test_tokens_carry_tenant_claims(self):
+        token = AccessToken(self.login())
+        self.assertEqual(token["tenant_id"], self.tenant.pk)
+        self.assertFalse(token["tenant_premium"])
+        self.assertEqual(token["username"], "stateless")
+        refresh = self.client.post('/api/token/refresh/', {"refresh": str(RefreshToken.for_user(self.user))}, format="json")
+        self.assertEqual(AccessToken(refresh.data["access"])["tenant_id"], self.tenant.pk)
+
+    def test_authentication_skips_the_user_query(self):
+        self.login()
+        # The tenant is loaded once per process, the user never.
+        with self.assertEndpointCost(queries=2):
+            self.assertEqual(self.client.get(reverse("patient-list")).status_code, 200)
+        with self.assertEndpointCost(queries=1):
+            self.assertEqual(self.client.get(reverse("patient-list")).status_code, 200)
+
+    @override_settings(JWT_STATELESS_AUTH=False)
+    def test_stateless_mode_can_be_disabled(self):
+        self.login()
+        tenant_cache.set(self.tenant.pk, self.tenant)
+        with self.assertEndpointCost(queries=2):
+            self.assertEqual(self.client.get(reverse("patient-list")).status_code, 200)
+
+    def test_tokens_without_tenant_claims_use_the_database(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_deactivated_user_is_revoked(self):
+        self.login()
+        self.assertEqual(self.client.get(reverse("patient-list")).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("patient-list")).status_code, 401)
+
+    def test_tenant_change_revokes_older_tokens(self):
+        self.login()
+        other = Tenant.objects.create(name="Other", type="clinic", patient_records_type=Tenant.RIGID)
+        profile = self.user.profile
+        profile.tenant = other
+        profile.save()
+        self.assertEqual(self.client.get(reverse("patient-list")).status_code, 401)
+
+        self.client.credentials()
+        self.login()
+        response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [])
+
+    def test_refresh_reads_the_current_tenant(self):
+        response = self.client.post('/api/token/', {"username": "stateless", "password": "statelesspass"}, format="json")
+        other = Tenant.objects.create(name="Moved", type="clinic", premium=True, patient_records_type=Tenant.RIGID)
+        profile = self.user.profile
+        profile.tenant = other
+        profile.save()
+        refresh = self.client.post('/api/token/refresh/', {"refresh": response.data["refresh"]}, format="json")
+        access = AccessToken(refresh.data["access"])
+        self.assertEqual((access["tenant_id"], access["tenant_premium"]), (other.pk, True))
+
+        profile.delete()
+        refresh = self.client.post('/api/token/refresh/', {"refresh": response.data["refresh"]}, format="json")
+        self.assertNotIn("tenant_id", AccessToken(refresh.data["access"]))
+
+    def test_revocation_cache_must_be_shared(self):
+        errors = [e.id for e in run_checks(tags=["security"]) if e.id.startswith("tenant.")]
+        self.assertEqual(errors, ["tenant.E002"])
+        with self.settings(AUTH_REVOCATION_CACHE="missing"):
+            errors = [e.id for e in run_checks(tags=["security"]) if e.id.startswith("tenant.")]
+        self.assertEqual(errors, ["tenant.E001"])
+        with self.settings(JWT_STATELESS_AUTH=False):
+            self.assertFalse([e for e in run_checks(tags=["security"]) if e.id.startswith("tenant.")])
+
+
+class TestTenantResolver(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tenant = Tenant.objects.create(
+            name="Resolved", type="clinic",
+            patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        Patient.objects.create(tenant=self.tenant, email="resolved@example.com")
+        user = User.objects.create_user(username="resolved", password="resolvedpass")
+        UserProfile.objects.create(user=user, tenant=self.tenant)
+        response = self.client.post(
+            '/api/token/', {"username": "resolved", "password": "resolvedpass"}, format="json"
+        )
+        self.token = response.data["access"]
+
+    def count_decodes(self):
+        return mock.patch.object(
+            CachedJWTAuthentication, "get_validated_token",
+            autospec=True, side_effect=CachedJWTAuthentication.get_validated_token
+        )
+
+    def test_token_is_decoded_once_per_request(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.count_decodes() as decode:
+            response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        auth = next(e for e in response["Server-Timing"].split(", ") if e.startswith("auth;"))
+        self.assertNotIn("calls", auth)
+
+    def test_invalid_token_is_rejected_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        with self.count_decodes() as decode:
+            response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_tenant_required_reuses_the_resolved_token(self):
+        @tenant_required
+        def view(_, request):
+            return Response({"tenant": request.tenant.pk})
+
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.count_decodes() as decode:
+            user, tenant = resolve_tenant(request)
+            response = view(None, Request(request))
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(tenant, self.tenant)
+        self.assertEqual(response.data, {"tenant": self.tenant.pk})
@@ -0,0 +1,212 @@
+import json
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from apps.api.benchmark import percentile
+from apps.api.models import AuditLog, Tombstone
+from apps.api.partitions import add_months, create_partition, month_start, monthly_partitions
+from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record
+from apps.tenant.cache import principal_cache, tenant_cache
+from apps.tenant.models import Tenant
+
+
+class TestExplainHotQueries(TestCase):
+    def test_explains_every_hot_query(self):
+        tenant = Tenant.objects.create(name="Explain", type="hospital", patient_records_type=Tenant.RIGID)
+        patient = Patient.objects.create(tenant=tenant, email="explain@example.com")
+        Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        out = StringIO()
+        call_command("explain_hot_queries", runs=1, stdout=out)
+        output = out.getvalue()
+        for name in ["patients list page", "records list page", "patient records", "audit log by tenant and time"]:
+            self.assertIn(name, output)
+
+    def test_denormalized_tenant_is_set_on_save(self):
+        tenant = Tenant.objects.create(name="Denormalized", type="hospital", patient_records_type=Tenant.RIGID)
+        patient = Patient.objects.create(tenant=tenant, email="denormalized@example.com")
+        record = Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        self.assertEqual(record.tenant_id, tenant.pk)
+
+        other = Tenant.objects.create(name="Other", type="clinic", patient_records_type=Tenant.RIGID)
+        record.patient = Patient.objects.create(tenant=other, email="reassigned@example.com")
+        record.save()
+        self.assertEqual(Record.objects.get(pk=record.pk).tenant_id, other.pk)
+        # The previous tenant's sync reports the record as deleted.
+        self.assertTrue(Tombstone.objects.filter(tenant=tenant, model="records.record", object_id=record.pk).exists())
+
+    def test_records_follow_their_patient_tenant(self):
+        tenant = Tenant.objects.create(name="Before", type="hospital", patient_records_type=Tenant.RIGID)
+        other = Tenant.objects.create(name="After", type="hospital", patient_records_type=Tenant.RIGID)
+        patient = Patient.objects.create(tenant=tenant, email="moved@example.com")
+        record = Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        patient = Patient.objects.get(pk=patient.pk)
+        patient.tenant = other
+        patient.save()
+        record.refresh_from_db()
+        self.assertEqual(record.tenant_id, other.pk)
+        with self.assertNumQueries(1):
+            patient.save()
+
+
+class TestInitialData(TestCase):
+    def tearDown(self):
+        # loaddata moves the PostgreSQL sequences back, so later tests reuse
+        # these pks: drop what was cached under them.
+        for cache in caches.all():
+            cache.clear()
+        principal_cache.clear()
+        tenant_cache.clear()
+
+    def test_fixture_loads(self):
+        call_command("loaddata", settings.BASE_DIR / "initial_data_custom.json", verbosity=0)
+        self.assertEqual(Patient.objects.count(), 2)
+        self.assertFalse(Patient.objects.filter(updated_at__isnull=True).exists())
+        self.assertFalse(Record.objects.filter(updated_at__isnull=True).exists())
+        # Raw saves get the patient's tenant too.
+        self.assertFalse(Record.objects.filter(tenant__isnull=True).exists())
+        self.assertFalse(FlexibleRecord.objects.filter(tenant__isnull=True).exists())
+
+
+class TestTombstones(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="Tombstones", type="hospital", patient_records_type=Tenant.RIGID)
+        self.patient = Patient.objects.create(tenant=self.tenant, email="tombstones@example.com")
+        self.records = [
+            Record.objects.create(patient=self.patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+            for _ in range(3)
+        ]
+
+    def test_patient_delete_tombstones_its_records_in_bulk(self):
+        patient_id, record_ids = self.patient.pk, [record.pk for record in self.records]
+        with CaptureQueriesContext(connection) as queries:
+            self.patient.delete()
+        statements = [query["sql"] for query in queries.captured_queries]
+        # The records go with one fast DELETE and their tombstones with one INSERT.
+        self.assertEqual(sum(sql.startswith(f'DELETE FROM "{Record._meta.db_table}"') for sql in statements), 1)
+        self.assertEqual(sum(sql.startswith(f'INSERT INTO "{Tombstone._meta.db_table}"') for sql in statements), 1)
+        self.assertEqual(
+            sorted(Tombstone.objects.filter(tenant=self.tenant, model="records.record").values_list("object_id", flat=True)),
+            record_ids,
+        )
+        self.assertTrue(Tombstone.objects.filter(tenant=self.tenant, model="patients.patient", object_id=patient_id).exists())
+
+    def test_record_deletes_write_tombstones(self):
+        record_ids = [self.records[0].pk, self.records[1].pk]
+        self.records[0].delete()
+        Record.objects.filter(pk=record_ids[1]).delete()
+        self.assertEqual(sorted(Tombstone.objects.filter(tenant=self.tenant).values_list("object_id", flat=True)), record_ids)
+
+    def test_tenant_delete_drops_its_tombstones(self):
+        self.records[0].delete()
+        self.tenant.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_purge_tombstones(self):
+        old = Tombstone.objects.create(tenant=self.tenant, model="records.record", object_id=1, deleted_at=timezone.now() - timedelta(days=31))
+        recent = Tombstone.objects.create(tenant=self.tenant, model="records.record", object_id=2, deleted_at=timezone.now() - timedelta(days=29))
+        call_command("purge_tombstones", dry_run=True, stdout=StringIO())
+        self.assertTrue(Tombstone.objects.filter(pk=old.pk).exists())
+        with self.settings(API_SYNC_TOKEN_MAX_AGE_DAYS=30):
+            call_command("purge_tombstones", stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list("pk", flat=True)), [recent.pk])
+
+
+class TestPartitionMonths(SimpleTestCase):
+    def test_add_months(self):
+        self.assertEqual(add_months(date(2026, 11, 1), 2), date(2027, 1, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -13), date(2024, 12, 1))
+
+
+class TestPercentile(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([7], 99), 7)
+
+
+@override_settings(AUDIT_LOG={"ASYNC": False})
+class TestLoadTest(TransactionTestCase):
+    def test_seeds_and_measures_every_endpoint(self):
+        call_command("seed_benchmark", tenants=4, patients=5, records=10, stdout=StringIO())
+        self.assertEqual(Tenant.objects.filter(name__startswith="bench-", premium=True).count(), 2)
+        self.assertEqual(Tenant.objects.filter(name__startswith="bench-", patient_records_type=Tenant.FLEXIBLE).count(), 2)
+
+        # One thread: SQLite test databases do not take concurrent writes.
+        with tempfile.NamedTemporaryFile(suffix=".json") as report:
+            call_command(
+                "loadtest", concurrency=1, requests=60, warmup=0, json=report.name,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            results = json.load(report)["results"]
+        self.assertEqual(results["total"]["requests"], 60)
+        self.assertEqual(results["total"]["errors"], 0)
+        self.assertGreater(results["total"]["queries_per_request"], 0)
+        self.assertLessEqual(results["total"]["p50_ms"], results["total"]["p99_ms"])
+
+        out = StringIO()
+        call_command("bench_auth", requests=5, stdout=out)
+        decodes = {line[:12].strip(): float(line.split()[-3]) for line in out.getvalue().splitlines()[-2:]}
+        self.assertEqual(decodes, {"per caller": 2.0, "resolver": 1.0})
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as report:
+            call_command(
+                "loadtest", interface="asgi", concurrency=1, requests=20, warmup=0, json=report.name,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            results = json.load(report)["results"]
+        self.assertEqual((results["total"]["requests"], results["total"]["errors"]), (20, 0))
+        self.assertGreater(results["total"]["queries_per_request"], 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning is PostgreSQL only")
+class TestAuditPartitions(TestCase):
+    def partition_rows(self, month):
+        name = monthly_partitions(connection.cursor())[month]
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{name}"')
+            return cursor.fetchone()[0]
+
+    def test_creates_future_partitions_and_moves_default_rows(self):
+        tenant = Tenant.objects.create(name="Partitions", type="clinic")
+        current = month_start(timezone.now())
+        future = add_months(current, 6)
+        log = AuditLog.objects.create(tenant=tenant, model="Patient", action="view", timestamp=timezone.now() + timedelta(days=190))
+        self.assertNotIn(month_start(log.timestamp), monthly_partitions(connection.cursor()))
+        call_command("audit_partitions", ahead=7, retention_months=None, stdout=StringIO())
+        partitions = monthly_partitions(connection.cursor())
+        for offset in range(8):
+            self.assertIn(add_months(current, offset), partitions)
+        self.assertGreaterEqual(month_start(log.timestamp), future)
+        self.assertEqual(self.partition_rows(month_start(log.timestamp)), 1)
+        self.assertEqual(AuditLog.objects.get(pk=log.pk).action, "view")
+
+    def test_drops_expired_partitions(self):
+        tenant = Tenant.objects.create(name="Retention", type="clinic")
+        expired = add_months(month_start(timezone.now()), -13)
+        with connection.cursor() as cursor:
+            create_partition(cursor, expired)
+        AuditLog.objects.create(tenant=tenant, model="Patient", action="view", timestamp=timezone.now() - timedelta(days=400))
+        recent = AuditLog.objects.create(tenant=tenant, model="Patient", action="view")
+
+        out = StringIO()
+        call_command("audit_partitions", retention_months=12, dry_run=True, stdout=out)
+        self.assertIn(f"drop api_auditlog_p{expired:%Y_%m}", out.getvalue())
+        self.assertEqual(AuditLog.objects.filter(tenant=tenant).count(), 2)
+
+        with connection.cursor() as cursor:
+            # The rows above are not committed: run their deferred FK checks
+            # now, or PostgreSQL refuses to drop the partition.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        call_command("audit_partitions", retention_months=12, stdout=StringIO())
+        self.assertNotIn(expired, monthly_partitions(connection.cursor()))
+        self.assertEqual(list(AuditLog.objects.filter(tenant=tenant)), [recent])
@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.patients.models import Patient
+from apps.records.models import Record, FlexibleRecord
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+from django.contrib.auth.models import User
+
+
+@override_settings(API_RESPONSE_CACHE=None)
+class TestFastListParity(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def login(self, tenant, username):
+        user = User.objects.create_user(username=username, password="parity")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        response = self.client.post('/api/token/', {"username": username, "password": "parity"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+
+    def assertSameBytes(self, url):
+        with self.settings(API_FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(url)
+        with self.settings(API_FAST_LIST_SERIALIZATION=True):
+            fast = self.client.get(url)
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(slow.content, fast.content)
+        return fast
+
+    def test_patients_parity(self):
+        tenant = Tenant.objects.create(
+            name="ParityHospital", type="hospital", patient_visible_fields=["all"],
+            patient_records_type=Tenant.RIGID, ssn_hippa_mandatory=True
+        )
+        for i in range(5):
+            Patient.objects.create(
+                tenant=tenant, first_name=f"Zoë {i}", last_name=None, email=f"parity{i}@example.com",
+                ssn_data={"number": f"000-00-000{i}", "verified": True, "verification_date": None}
+            )
+        self.login(tenant, "paritypatients")
+        response = self.assertSameBytes(reverse("patient-list") + "?page_size=3")
+        self.assertSameBytes(response.data["next"])
+
+    def test_rigid_records_parity(self):
+        tenant = Tenant.objects.create(
+            name="ParityRigid", type="hospital", patient_visible_fields=["email"], patient_records_type=Tenant.RIGID
+        )
+        patient = Patient.objects.create(tenant=tenant, email="rigidparity@example.com")
+        for i in range(4):
+            Record.objects.create(patient=patient, diagnosis=f"Diagnosis {i}", treatment="Rest", doctor_name="Dr. Smith", notes=None if i % 2 else "Notes")
+        self.login(tenant, "parityrigid")
+        self.assertSameBytes(reverse("record-list"))
+
+    def test_flexible_records_parity(self):
+        tenant = Tenant.objects.create(
+            name="ParityFlexible", type="clinic", patient_visible_fields=["email"], patient_records_type=Tenant.FLEXIBLE
+        )
+        patient = Patient.objects.create(tenant=tenant, email="flexparity@example.com")
+        for i in range(4):
+            FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"value": i / 3, "nested": {"ok": True, "tags": ["a", "ü"]}})
+        self.login(tenant, "parityflexible")
+        self.assertSameBytes(reverse("record-list") + "?data_has_key=nested")
@@ -0,0 +1,96 @@
+import time
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.api.instrumentation import REGISTRY, RequestTimings, phase, recording
+from apps.patients.models import Patient
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+
+
+class TestRequestTimings(SimpleTestCase):
+    def test_nested_phases_are_exclusive(self):
+        timings = RequestTimings()
+        with recording(timings):
+            with phase("auth"):
+                time.sleep(0.01)
+                with phase("db"):
+                    time.sleep(0.02)
+            with phase("auth"):
+                pass
+        timings.finish()
+        self.assertEqual(timings.counts["auth"], 2)
+        self.assertGreaterEqual(timings.durations["db"], 0.02)
+        self.assertLess(timings.durations["auth"], 0.02)
+        self.assertLessEqual(sum(timings.durations.values()), timings.total)
+        self.assertIn('auth;dur=', timings.server_timing())
+        self.assertIn('desc="2 calls"', timings.server_timing())
+
+    def test_phase_is_a_no_op_outside_requests(self):
+        with phase("auth"):
+            pass
+
+
+class TestInstrumentationMiddleware(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for metric in REGISTRY:
+            metric.clear()
+        self.tenant = Tenant.objects.create(
+            name="Timed", type="clinic", patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        Patient.objects.create(tenant=self.tenant, email="timed@example.com")
+        user = User.objects.create_user(username="timed", password="timedpass")
+        UserProfile.objects.create(user=user, tenant=self.tenant)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_token("timed", "timedpass")}')
+
+    def get_token(self, username, password):
+        response = self.client.post('/api/token/', {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def test_server_timing_reports_phases(self):
+        response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        phases = {entry.split(";")[0] for entry in response["Server-Timing"].split(", ")}
+        self.assertTrue({"auth", "db", "view", "render", "total"} <= phases, response["Server-Timing"])
+
+    def test_metrics_endpoint_aggregates_requests(self):
+        self.client.get(reverse("patient-list"))
+        self.client.get(reverse("patient-list"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE api_request_duration_seconds histogram", body)
+        self.assertIn('api_request_duration_seconds_count{view="patient-list",method="GET",status="200"} 2', body)
+        self.assertIn('api_request_phase_seconds_count{view="patient-list",phase="auth"} 2', body)
+        self.assertIn('api_response_size_bytes_count{view="patient-list"} 2', body)
+        # Per-tenant series are opt-in.
+        self.assertNotIn("api_tenant_request_duration_seconds_count", body)
+
+    @override_settings(API_METRICS_TENANT_SERIES=1)
+    def test_tenant_series_are_capped(self):
+        other = Tenant.objects.create(
+            name="TimedOther", type="clinic", patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="timedother", password="timedpass")
+        UserProfile.objects.create(user=user, tenant=other)
+        self.client.get(reverse("patient-list"))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_token("timedother", "timedpass")}')
+        self.client.get(reverse("patient-list"))
+        body = self.client.get(reverse("metrics")).content.decode()
+        # The first list and the token request, still sent with its credentials.
+        self.assertIn(f'api_tenant_request_duration_seconds_count{{tenant="{self.tenant.pk}"}} 2', body)
+        self.assertIn('api_tenant_request_duration_seconds_count{tenant="other"} 1', body)
+
+    def test_metrics_are_only_served_to_allowed_ips(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(API_INSTRUMENTATION=False)
+    def test_can_be_disabled(self):
+        response = self.client.get(reverse("patient-list"))
+        self.assertFalse(response.has_header("Server-Timing"))
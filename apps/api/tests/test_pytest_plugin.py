@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.api.pytest_plugin import RequestQueries, RequestRecorder, describe_endpoint
+from apps.api.views import PatientViewSet
+from apps.patients.models import Patient
+from apps.tenant.models import Tenant
+from apps.user.models import UserProfile
+
+
+class TestQueryPatterns(SimpleTestCase):
+    def test_budget_comes_from_the_viewset_action(self):
+        self.assertEqual(
+            describe_endpoint("GET", "/api/patients/1/"),
+            ("patient-detail", "retrieve", PatientViewSet.query_budget["retrieve"]),
+        )
+        self.assertEqual(describe_endpoint("GET", "/nowhere/"), (None, None, None))
+
+    def test_duplicates_and_repeated_shapes(self):
+        request = RequestQueries("GET", "/api/patients/")
+        request.queries = [
+            ("SELECT user WHERE id = %s", "(1,)"),
+            ("SELECT user WHERE id = %s", "(1,)"),
+            *(("SELECT record WHERE patient_id = %s", f"({pk},)") for pk in range(3)),
+        ]
+        self.assertEqual(request.duplicates(), [("SELECT user WHERE id = %s", 2)])
+        self.assertEqual(request.repeated(3), [("SELECT record WHERE patient_id = %s", 3)])
+        self.assertEqual(request.repeated(4), [])
+
+
+class TestRequestRecorder(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_token(self, username, password):
+        response = self.client.post('/api/token/', {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def test_records_queries_per_request(self):
+        tenant = Tenant.objects.create(
+            name="Recorded", type="clinic", patient_visible_fields=["all"], patient_records_type=Tenant.RIGID
+        )
+        Patient.objects.create(tenant=tenant, email="recorded@example.com")
+        user = User.objects.create_user(username="recorded", password="recordedpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.get_token("recorded", "recordedpass")}')
+
+        recorder = RequestRecorder()
+        with recorder.installed():
+            Patient.objects.count()  # outside any request: not recorded
+            response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        [request] = recorder.requests
+        self.assertEqual((request.view, request.action), ("patient-list", "list"))
+        self.assertTrue(any("patients_patient" in sql for sql, _ in request.queries))
+        self.assertEqual(request.duplicates(), [])
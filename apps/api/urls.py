@@ -1,12 +1,20 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
-from apps.api.views import PatientViewSet, RecordViewSet
+from apps.api.async_views import async_urlpatterns
+from apps.api.views import AuditLogViewSet, PatientViewSet, RecordViewSet, metrics
 
 router = routers.DefaultRouter()
-router.register(r'patients', PatientViewSet)
+router.register(r'patients', PatientViewSet, basename='patient')
 router.register(r'records', RecordViewSet, basename='record')
+router.register(r'audit-logs', AuditLogViewSet, basename='auditlog')
+
+router_urls = router.urls
+if getattr(settings, 'API_ASYNC_VIEWS', False):
+    router_urls = async_urlpatterns(router_urls)
 
 urlpatterns = [
-    path('', include(router.urls)),
-]
\ No newline at end of file
+    path('metrics/', metrics, name='metrics'),
+    path('', include(router_urls)),
+]
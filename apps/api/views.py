@@ -1,14 +1,32 @@
-from django.shortcuts import render, get_object_or_404
-from rest_framework import serializers, viewsets
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+from django.utils.dateparse import parse_date
+from rest_framework import mixins, serializers, viewsets
+from rest_framework.decorators import action
 from rest_framework.generics import RetrieveAPIView
 from apps.patients.models import Patient
 from apps.tenant.models import Tenant
 from apps.records.models import Record, FlexibleRecord
+from .models import AuditDailyCount, AuditLog
 
 from rest_framework.response import Response
 from rest_framework import status
 
+from .async_views import AsyncViewSetMixin, asave
+from .bulk import bulk_response, get_bulk_items
+from .cache import CachedResponseMixin, invalidate_tenant
+from .conditional import ConditionalGetMixin
+from .export import streaming_export
+from .fastpath import FastListMixin
+from .filters import AuditLogFilterBackend, RecordFilterBackend
+from .instrumentation import render_metrics
 from .middleware import AuditMixin
+from .pagination import AuditLogPagination, KeysetPagination, RecordPagination
+from .permissions import IsPremiumTenant
+from .sync import sync_response
 
 class PatientSerializer(serializers.ModelSerializer):
     ssn = serializers.CharField(required=False, allow_blank=True)
@@ -17,6 +35,8 @@ class PatientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = '__all__'
+        # Patients belong to the request tenant (PatientViewSet.perform_create).
+        read_only_fields = ['tenant']
 
     def to_representation(self, instance):
         request = self.context.get("request")
@@ -81,42 +101,246 @@ class PatientSerializer(serializers.ModelSerializer):
         return value
 
 
-class PatientViewSet(AuditMixin, viewsets.ModelViewSet):
-    queryset = Patient.objects.all()
+class PatientBulkItemSerializer(PatientSerializer):
+    """
+    PatientSerializer for bulk items: the tenant comes from the request and
+    email uniqueness is checked once for the whole batch by the view.
+    """
+    class Meta(PatientSerializer.Meta):
+        fields = None
+        exclude = ['tenant']
+        extra_kwargs = {'email': {'validators': []}}
+
+
+def visible_patient_fields(tenant):
+    """
+    Patient fields the tenant may see, as the ``fields`` argument of
+    PatientSerializer: None means every field.
+    """
+    if tenant and hasattr(tenant, 'patient_visible_fields'):
+        if 'all' in tenant.patient_visible_fields:
+            return None
+        return tenant.patient_visible_fields
+    return []
+
+
+class PatientReadSerializer(PatientSerializer):
+    """
+    Base of the per-tenant read plans built by patient_read_serializer_class:
+    Meta.fields already excludes what the tenant may not see, so there is
+    nothing left to prune per instance or per row.
+    """
+    to_representation = serializers.ModelSerializer.to_representation
+
+
+_patient_read_plans = {}
+
+
+def patient_read_serializer_class(tenant):
+    """
+    Returns the read serializer class for the tenant, compiled from its
+    patient_visible_fields and ssn_hippa_mandatory. Classes are cached per
+    tenant and rebuilt when those settings change.
+    """
+    visible = visible_patient_fields(tenant)
+    hipaa_mandatory = getattr(tenant, 'ssn_hippa_mandatory', False)
+    signature = (None if visible is None else tuple(visible), hipaa_mandatory)
+    key = getattr(tenant, 'pk', None)
+    plan = _patient_read_plans.get(key)
+    if plan is not None and plan[0] == signature:
+        return plan[1]
+
+    hidden = 'ssn' if hipaa_mandatory else 'ssn_data'
+    names = [
+        name for name in PatientSerializer().fields
+        if name != hidden and (visible is None or name in visible)
+    ]
+    meta = type('Meta', (PatientSerializer.Meta,), {'fields': names})
+    serializer_class = type('PatientReadSerializer', (PatientReadSerializer,), {'Meta': meta})
+    _patient_read_plans[key] = (signature, serializer_class)
+    return serializer_class
+
+
+_expanded_patient_classes = {}
+
+
+def expanded_patient_serializer_class(tenant, serializer_class, record_serializer_class):
+    """
+    Adds a read-only ``records`` list to a patient read serializer, filled
+    from the ``expanded_records`` attribute set by PatientViewSet's prefetch.
+    Cached per tenant like patient_read_serializer_class, and replaced when
+    the tenant's read class or record type changes.
+    """
+    signature = (serializer_class, record_serializer_class)
+    key = getattr(tenant, 'pk', None)
+    plan = _expanded_patient_classes.get(key)
+    if plan is not None and plan[0] == signature:
+        return plan[1]
+
+    meta = type('Meta', (serializer_class.Meta,), {
+        'fields': list(serializer_class.Meta.fields) + ['records']
+    })
+    expanded_class = type(serializer_class.__name__, (serializer_class,), {
+        'Meta': meta,
+        'records': record_serializer_class(many=True, read_only=True, source='expanded_records'),
+    })
+    _expanded_patient_classes[key] = (signature, expanded_class)
+    return expanded_class
+
+
+class PatientViewSet(AuditMixin, CachedResponseMixin, ConditionalGetMixin, FastListMixin, AsyncViewSetMixin, viewsets.ModelViewSet):
     serializer_class = PatientSerializer
-    
-    def retrieve(self, request, *args, **kwargs):
-        response = super().retrieve(request, *args, **kwargs)
-        patient = self.get_object()  # fetch patient by pk
-        tenant = getattr(request, 'tenant', None)
-        allowed_fields = []
-
-        if tenant and hasattr(tenant, 'patient_visible_fields'):
-            if 'all' in tenant.patient_visible_fields:
-                allowed_fields = None
-            else:
-                allowed_fields = tenant.patient_visible_fields
-        patient_data = self.get_serializer(self.get_object(), fields=allowed_fields).data
-        #serializer = self.get_serializer(patient, fields=allowed_fields)
-        response.data = patient_data
-        return response
-    
+    pagination_class = KeysetPagination
+    # Most queries a request may run per action, checked by the test suite
+    # (apps.api.pytest_plugin). Counts a principal or tenant cache miss and
+    # audit events written synchronously (AUDIT_LOG['ASYNC'] = False).
+    query_budget = {
+        'list': 5, 'retrieve': 5, 'create': 6, 'update': 7, 'partial_update': 7,
+        'sync': 6, 'bulk_create': 6,
+    }
+    expandable = ('records',)
+
+    def get_expand(self):
+        """Values of ?expand= (comma separated) for list and retrieve."""
+        if self.action not in ('list', 'retrieve'):
+            return set()
+        requested = {name for name in self.request.query_params.get('expand', '').split(',') if name}
+        unknown = requested.difference(self.expandable)
+        if unknown:
+            raise serializers.ValidationError({'expand': f'Unknown value(s): {", ".join(sorted(unknown))}.'})
+        return requested
+
+    def get_queryset(self):
+        tenant = getattr(self.request, 'tenant', None)
+        queryset = Patient.objects.for_tenant(tenant)
+        if tenant is not None and 'records' in self.get_expand():
+            # One extra query for the whole page: the slice is applied per
+            # patient with a window function.
+            model = tenant_record_model(tenant)
+            limit = getattr(settings, 'API_EXPANDED_RECORDS_LIMIT', 20)
+            queryset = queryset.prefetch_related(Prefetch(
+                f'{model._meta.model_name}_set',
+                queryset=model.objects.order_by('-created_at', '-id')[:limit],
+                to_attr='expanded_records',
+            ))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve', 'sync'):
+            tenant = getattr(self.request, 'tenant', None)
+            serializer_class = patient_read_serializer_class(tenant)
+            if tenant is not None and 'records' in self.get_expand():
+                serializer_class = expanded_patient_serializer_class(
+                    tenant, serializer_class, tenant_record_serializer_class(tenant)
+                )
+            return serializer_class
+        return super().get_serializer_class()
+
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.tenant)
+
+    async def aperform_create(self, serializer):
+        await asave(serializer, tenant=self.request.tenant)
+
+    @action(detail=False, methods=['get'], url_path='sync')
+    def sync(self, request):
+        """
+        Patients created, updated and deleted since ``?token=`` (see
+        apps.api.sync); the response carries the token for the next call.
+        """
+        self.log_audit("sync")
+        return sync_response(request, self.get_queryset(), self.get_serializer_class(), self.get_serializer_context())
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Creates a list of patients for the tenant. Items are validated with a
+        single serializer instance, emails are checked for uniqueness with one
+        query and valid rows are written with bulk_create. Invalid items are
+        reported by index and do not block the rest.
+        """
+        items = get_bulk_items(request)
+        tenant = request.tenant
+        child = PatientBulkItemSerializer(context=self.get_serializer_context())
+        errors = {}
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+
+        emails = [attrs['email'] for _, attrs in valid]
+        taken = set(Patient.objects.filter(email__in=emails).values_list('email', flat=True))
+        patients = []
+        for index, attrs in valid:
+            if attrs['email'] in taken:
+                errors[index] = {'email': ['patient with this email already exists.']}
+                continue
+            taken.add(attrs['email'])
+            patients.append(Patient(tenant=tenant, **attrs))
+
+        try:
+            with transaction.atomic():
+                Patient.objects.bulk_create(
+                    patients, batch_size=getattr(settings, 'API_BULK_BATCH_SIZE', 500)
+                )
+            # bulk_create sends no post_save signals.
+            invalidate_tenant(tenant.pk)
+        except IntegrityError:
+            return Response(
+                {'detail': 'Some emails were registered concurrently, retry the request.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if patients:
+            self.log_audit("bulk_create", extra={
+                "object_ids": [patient.pk for patient in patients],
+                "count": len(patients),
+            })
+        return bulk_response(self.get_serializer(patients, many=True).data, errors)
 
 
 class RecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = Record
-        fields = '__all__'
+        exclude = ['tenant']
 
 class FlexibleRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = FlexibleRecord
-        fields = '__all__'
+        exclude = ['tenant']
 
-class RecordViewSet(AuditMixin, viewsets.ModelViewSet):
+def tenant_record_model(tenant):
+    if tenant.patient_records_type == Tenant.FLEXIBLE:
+        return FlexibleRecord
+    return Record
+
+def tenant_record_serializer_class(tenant):
+    if tenant.patient_records_type == Tenant.FLEXIBLE:
+        return FlexibleRecordSerializer
+    return RecordSerializer
+
+class RecordBulkItemSerializer(RecordSerializer):
+    """Bulk items: patients are resolved by the view for the whole batch."""
+    class Meta(RecordSerializer.Meta):
+        exclude = ['patient', 'tenant']
+
+class FlexibleRecordBulkItemSerializer(FlexibleRecordSerializer):
+    """Bulk items: patients are resolved by the view for the whole batch."""
+    class Meta(FlexibleRecordSerializer.Meta):
+        exclude = ['patient', 'tenant']
+
+class RecordViewSet(AuditMixin, CachedResponseMixin, ConditionalGetMixin, FastListMixin, AsyncViewSetMixin, viewsets.ModelViewSet):
     """
     Handles patient records, using a dynamic serializer depending on tenant type.
     """
+    pagination_class = RecordPagination
+    # See PatientViewSet.query_budget.
+    query_budget = {
+        'list': 4, 'retrieve': 4, 'create': 5, 'sync': 6, 'bulk_create': 6, 'export': 4,
+    }
+    filter_backends = [RecordFilterBackend]
 
     def get_serializer_class(self):
         tenant = self.request.tenant
@@ -130,13 +354,166 @@ class RecordViewSet(AuditMixin, viewsets.ModelViewSet):
         tenant = self.request.tenant
 
         if tenant.patient_records_type == Tenant.RIGID:
-            return Record.objects.filter(patient__tenant=tenant)
+            return Record.objects.for_tenant(tenant)
         if tenant.patient_records_type == Tenant.FLEXIBLE:
-            return FlexibleRecord.objects.filter(patient__tenant=tenant)
+            return FlexibleRecord.objects.for_tenant(tenant)
         
 
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<export_format>ndjson|csv)')
+    def export(self, request, export_format=None):
+        """
+        Streams every record of the tenant as NDJSON or CSV, each row with
+        the patient fields the tenant is allowed to see.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).select_related('patient').order_by('created_at', 'id')
+        patient_serializer = patient_read_serializer_class(request.tenant)(
+            context=self.get_serializer_context()
+        )
+        self.log_audit("export", extra={"format": export_format})
+        return streaming_export(queryset, self.get_serializer(), patient_serializer, export_format)
+
+    @action(detail=False, methods=['get'], url_path='sync')
+    def sync(self, request):
+        """
+        Records of the tenant's record type created, updated and deleted
+        since ``?token=`` (see apps.api.sync).
+        """
+        self.log_audit("sync")
+        return sync_response(request, self.get_queryset(), self.get_serializer_class(), self.get_serializer_context())
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Ingests a list of records for the tenant's record type. Referenced
+        patients are resolved with one query, items are validated with a
+        single serializer instance and written with bulk_create in chunks.
+        Invalid items, and items of a chunk the database rejects, are
+        reported by index without blocking the rest.
+        """
+        items = get_bulk_items(request)
+        tenant = request.tenant
+        if tenant.patient_records_type == Tenant.RIGID:
+            model, child_class = Record, RecordBulkItemSerializer
+        else:
+            model, child_class = FlexibleRecord, FlexibleRecordBulkItemSerializer
+
+        patient_ids = set()
+        for item in items:
+            try:
+                patient_ids.add(int(item['patient']))
+            except (TypeError, KeyError, ValueError):
+                pass
+        known_patients = set(
+            Patient.objects.for_tenant(tenant).filter(pk__in=patient_ids).values_list('pk', flat=True)
+        )
+
+        child = child_class(context=self.get_serializer_context())
+        errors = {}
+        pending = []
+        for index, item in enumerate(items):
+            try:
+                attrs = child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+                continue
+            try:
+                patient_id = int(item['patient'])
+            except (TypeError, KeyError, ValueError):
+                errors[index] = {'patient': ['This field is required.']}
+                continue
+            if patient_id not in known_patients:
+                errors[index] = {'patient': [f'Invalid pk "{patient_id}" - object does not exist.']}
+                continue
+            pending.append((index, model(patient_id=patient_id, tenant=tenant, **attrs)))
+
+        created = []
+        batch_size = getattr(settings, 'API_BULK_BATCH_SIZE', 500)
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create([record for _, record in chunk])
+            except DatabaseError:
+                for index, _ in chunk:
+                    errors[index] = {'non_field_errors': ['The record could not be stored.']}
+                continue
+            created.extend(record for _, record in chunk)
+        if created:
+            # bulk_create sends no post_save signals.
+            invalidate_tenant(tenant.pk)
+            self.log_audit("bulk_create", extra={
+                "object_ids": [record.pk for record in created],
+                "count": len(created),
+            })
+        return bulk_response(self.get_serializer(created, many=True).data, errors)
+
     def perform_create(self, serializer):
         tenant = self.request.tenant
-        patient = get_object_or_404(Patient, pk=int(self.request.data.get("patient")), tenant=tenant)
-        serializer.save(patient=patient)
+        # The serializer already loaded the patient: only its tenant is checked.
+        if serializer.validated_data["patient"].tenant_id != tenant.pk:
+            raise Http404
+        serializer.save(tenant=tenant)
+
+    async def aperform_create(self, serializer):
+        tenant = self.request.tenant
+        if serializer.validated_data["patient"].tenant_id != tenant.pk:
+            raise Http404
+        await asave(serializer, tenant=tenant)
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditLog
+        exclude = ['tenant']
+
+class AuditDailyCountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditDailyCount
+        fields = ['day', 'model', 'action', 'count']
+
+class AuditLogViewSet(AuditMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Audit log of the tenant for compliance (premium tenants only), newest
+    first with keyset pagination on (timestamp, id).
+    """
+    serializer_class = AuditLogSerializer
+    pagination_class = AuditLogPagination
+    filter_backends = [AuditLogFilterBackend]
+    permission_classes = [IsPremiumTenant]
+    # See PatientViewSet.query_budget.
+    query_budget = {'list': 4, 'daily': 4}
+
+    def get_queryset(self):
+        return AuditLog.objects.filter(tenant=self.request.tenant)
+
+    @action(detail=False, methods=['get'], url_path='daily')
+    def daily(self, request):
+        """
+        Event counts per day, model and action from the AuditDailyCount
+        rollup. Filters: ``day_after`` (inclusive) / ``day_before``
+        (exclusive) as ISO dates, ``model`` and ``action``.
+        """
+        queryset = AuditDailyCount.objects.filter(tenant=request.tenant)
+        for name, lookup in (('day_after', 'day__gte'), ('day_before', 'day__lt')):
+            if name in request.query_params:
+                try:
+                    # ValueError for well formatted but invalid dates.
+                    day = parse_date(request.query_params[name])
+                except ValueError:
+                    day = None
+                if day is None:
+                    raise serializers.ValidationError({name: 'Expected an ISO 8601 date.'})
+                queryset = queryset.filter(**{lookup: day})
+        for name in ('model', 'action'):
+            if name in request.query_params:
+                queryset = queryset.filter(**{name: request.query_params[name]})
+        queryset = queryset.order_by('day', 'model', 'action')
+        self.log_audit("daily")
+        return Response(AuditDailyCountSerializer(queryset, many=True).data)
+
 
+def metrics(request):
+    """In-process request histograms in the Prometheus text format."""
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'API_METRICS_ALLOWED_IPS', ()):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_patient_ssn_data'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'id'], name='patient_tenant_id_idx'),
+        ),
+    ]
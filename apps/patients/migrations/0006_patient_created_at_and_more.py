@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0005_patient_updated_at'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='patient_tenant_updated_idx'),
+        ),
+    ]
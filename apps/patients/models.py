@@ -1,5 +1,5 @@
 from django.db import models
-from apps.tenant.models import Tenant
+from apps.tenant.models import Tenant, TenantScopedQuerySet
 
 class Patient(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='patients', null=True, blank=True)
@@ -8,6 +8,29 @@ class Patient(models.Model):
     ssn = models.CharField(max_length=20, null=True, blank=True)
     email = models.EmailField(max_length=254, unique=True)
     ssn_data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantScopedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'id'], name='patient_tenant_id_idx'),
+            models.Index(fields=['tenant', 'updated_at', 'id'], name='patient_tenant_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The tenant as loaded: records move with the patient when it changes
+        # (apps.records.models) and the previous tenant gets tombstones
+        # (apps.api.sync).
+        instance._loaded_tenant_id = instance.__dict__.get('tenant_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_tenant_id = self.tenant_id
 
     def __str__(self):
         return str(self.tenant) + self.email
\ No newline at end of file
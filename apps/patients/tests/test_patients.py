@@ -1,12 +1,21 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
+from apps.api.testing import EndpointCostMixin
+from apps.api.views import (
+    _expanded_patient_classes, FlexibleRecordSerializer, PatientSerializer, RecordSerializer, expanded_patient_serializer_class,
+    patient_read_serializer_class,
+)
 from apps.patients.models import Patient
+from apps.records.models import FlexibleRecord, Record
 from apps.tenant.models import Tenant
 from django.contrib.auth.models import User
 from apps.user.models import UserProfile
 
-class TestPatientViews(TestCase):
+class TestPatientViews(EndpointCostMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
 
@@ -25,6 +34,28 @@ class TestPatientViews(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(Patient.objects.filter(email="partial@example.com").exists())
 
+    def test_created_patient_belongs_to_the_request_tenant(self):
+        tenant = Tenant.objects.create(name="Clinic", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        other = Tenant.objects.create(name="Other", type="clinic", allow_partial_patients=True)
+        user = User.objects.create_user(username="owner", password="ownerpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("owner", "ownerpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(reverse("patient-list"), {"email": "owned@example.com", "tenant": other.pk})
+        self.assertEqual(response.status_code, 201)
+        patient = Patient.objects.get(email="owned@example.com")
+        self.assertEqual(patient.tenant_id, tenant.pk)
+        response = self.client.get(reverse("patient-detail", args=[patient.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"email": "owned@example.com"})
+
+        response = self.client.patch(
+            reverse("patient-detail", args=[patient.pk]), {"email": "owned@example.com", "tenant": other.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        patient.refresh_from_db()
+        self.assertEqual(patient.tenant_id, tenant.pk)
+
     def test_create_patient_all_fields(self):
         tenant = Tenant.objects.create(name="Hospital", type="hospital", allow_partial_patients=False, patient_visible_fields=["first_name", "last_name", "ssn", "email"])
         user = User.objects.create_user(username="testuser2", password="testpass2")
@@ -91,3 +122,309 @@ class TestPatientViews(TestCase):
         self.assertEqual(set(data.keys()), {"first_name", "email"})
         self.assertEqual(data["first_name"], "Visible")
         self.assertEqual(data["email"], "visiblefields@example.com")
+
+    @override_settings(API_RESPONSE_CACHE=None)
+    def test_patient_detail_query_count(self):
+        tenant = Tenant.objects.create(name="ClinicQueries", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        patient = Patient.objects.create(tenant=tenant, email="queries@example.com")
+        user = User.objects.create_user(username="queriesuser", password="queriespass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("queriesuser", "queriespass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk])
+        # First request loads user, profile and tenant in one query; DRF
+        # authentication reuses the cached principal.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Steady state: only the patient SELECT.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"email": "queries@example.com"})
+
+    def test_tenant_change_invalidates_cached_principal(self):
+        tenant = Tenant.objects.create(name="ClinicCache", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        patient = Patient.objects.create(tenant=tenant, first_name="Cached", email="cached@example.com")
+        user = User.objects.create_user(username="cacheuser", password="cachepass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("cacheuser", "cachepass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk])
+        self.assertEqual(set(self.client.get(url).data.keys()), {"email"})
+        tenant.patient_visible_fields = ["first_name", "email"]
+        tenant.save()
+        self.assertEqual(set(self.client.get(url).data.keys()), {"first_name", "email"})
+
+    def test_bulk_create_patients(self):
+        tenant = Tenant.objects.create(name="BulkHospital", type="hospital", allow_partial_patients=False, patient_visible_fields=["all"])
+        user = User.objects.create_user(username="bulkuser", password="bulkpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        Patient.objects.create(tenant=tenant, email="taken@example.com")
+        token = self.get_token("bulkuser", "bulkpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        items = [
+            {"first_name": "Ann", "last_name": "Lee", "ssn": "111-11-1111", "email": "ann@example.com"},
+            {"first_name": "Ben", "last_name": "Lee", "email": "ben@example.com"},
+            {"first_name": "Cal", "last_name": "Lee", "ssn": "333-33-3333", "email": "taken@example.com"},
+            {"first_name": "Dee", "last_name": "Lee", "ssn": "444-44-4444", "email": "ann@example.com"},
+            {"first_name": "Eve", "last_name": "Lee", "ssn": "555-55-5555", "email": "eve@example.com"},
+        ]
+        # One uniqueness SELECT and one INSERT (plus the savepoint pair of
+        # the test transaction): no per-item queries.
+        self.client.post(reverse("patient-bulk-create"), [], format="json")
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("patient-bulk-create"), items, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([p["email"] for p in response.data["created"]], ["ann@example.com", "eve@example.com"])
+        self.assertEqual([e["index"] for e in response.data["errors"]], [1, 2, 3])
+        self.assertIn("ssn", response.data["errors"][0]["errors"])
+        self.assertIn("email", response.data["errors"][1]["errors"])
+        self.assertEqual(Patient.objects.filter(tenant=tenant).count(), 3)
+
+    def test_bulk_create_requires_a_list(self):
+        tenant = Tenant.objects.create(name="BulkClinic", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        user = User.objects.create_user(username="bulkuser2", password="bulkpass2")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("bulkuser2", "bulkpass2")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(reverse("patient-bulk-create"), {"email": "one@example.com"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(API_RESPONSE_CACHE='api')
+    def test_patient_detail_is_cached_until_patient_changes(self):
+        tenant = Tenant.objects.create(name="ClinicResponses", type="clinic", allow_partial_patients=True, patient_visible_fields=["first_name", "email"])
+        patient = Patient.objects.create(tenant=tenant, first_name="Before", email="responses@example.com")
+        user = User.objects.create_user(username="responsesuser", password="responsespass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("responsesuser", "responsespass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk])
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["first_name"], "Before")
+        patient.first_name = "After"
+        patient.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["first_name"], "After")
+
+    def test_patient_list_serves_visible_fields(self):
+        tenant = Tenant.objects.create(name="ClinicList", type="clinic", allow_partial_patients=True, patient_visible_fields=["first_name", "email"])
+        Patient.objects.create(tenant=tenant, first_name="Listed", last_name="Hidden", email="listed@example.com")
+        user = User.objects.create_user(username="listuser", password="listpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("listuser", "listpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("patient-list"))
+        self.assertEqual(response.status_code, 200)
+        for row in response.data["results"]:
+            self.assertEqual(set(row.keys()), {"first_name", "email"})
+
+
+    @override_settings(API_RESPONSE_CACHE=None)
+    def test_patient_list_is_scoped_to_tenant(self):
+        tenant = Tenant.objects.create(name="ClinicScoped", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        other = Tenant.objects.create(name="ClinicOther", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        for i in range(3):
+            Patient.objects.create(tenant=tenant, email=f"scoped{i}@example.com")
+        foreign = [Patient.objects.create(tenant=other, email=f"other{i}@example.com") for i in range(5)]
+        user = User.objects.create_user(username="scopeduser", password="scopedpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("scopeduser", "scopedpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(reverse("patient-list"))
+        # One SELECT reading only the tenant's rows.
+        with self.assertEndpointCost(queries=1, rows=3):
+            response = self.client.get(reverse("patient-list"))
+        self.assertEqual(
+            [row["email"] for row in response.data["results"]],
+            [f"scoped{i}@example.com" for i in range(3)]
+        )
+        response = self.client.get(reverse("patient-detail", args=[foreign[0].pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.patch(reverse("patient-detail", args=[foreign[0].pk]), {"first_name": "X"}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+
+    @override_settings(API_RESPONSE_CACHE=None, API_EXPANDED_RECORDS_LIMIT=2)
+    def test_patient_detail_expands_latest_records(self):
+        tenant = Tenant.objects.create(name="ClinicChart", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"], patient_records_type=Tenant.FLEXIBLE)
+        patient = Patient.objects.create(tenant=tenant, email="chart@example.com")
+        records = [FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"i": i}) for i in range(3)]
+        user = User.objects.create_user(username="chartuser", password="chartpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("chartuser", "chartpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk]) + "?expand=records"
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], "chart@example.com")
+        self.assertEqual([r["id"] for r in response.data["records"]], [records[2].pk, records[1].pk])
+        self.assertEqual(response.data["records"][0]["data"], {"i": 2})
+        self.assertNotIn("records", self.client.get(reverse("patient-detail", args=[patient.pk])).data)
+
+    @override_settings(API_RESPONSE_CACHE=None, API_EXPANDED_RECORDS_LIMIT=2)
+    def test_patient_list_expands_records_without_n_plus_one(self):
+        tenant = Tenant.objects.create(name="HospitalCharts", type="hospital", allow_partial_patients=True, patient_visible_fields=["email"], patient_records_type=Tenant.RIGID)
+        for i in range(4):
+            patient = Patient.objects.create(tenant=tenant, email=f"charts{i}@example.com")
+            for j in range(i):
+                Record.objects.create(patient=patient, diagnosis=f"D{j}", treatment="Rest", doctor_name="Dr. Smith")
+        user = User.objects.create_user(username="chartsuser", password="chartspass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("chartsuser", "chartspass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-list") + "?expand=records"
+        self.client.get(url)
+        # Patients page plus one records query, with at most 2 records each.
+        with self.assertEndpointCost(queries=2, rows=4 + 0 + 1 + 2 + 2):
+            response = self.client.get(url)
+        self.assertEqual([len(row["records"]) for row in response.data["results"]], [0, 1, 2, 2])
+        self.assertEqual(response.data["results"][3]["records"][0]["diagnosis"], "D2")
+        with self.settings(API_FAST_LIST_SERIALIZATION=True):
+            self.assertEqual(self.client.get(url).data, response.data)
+        response = self.client.get(reverse("patient-list") + "?expand=audit")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expand", response.data)
+
+
+    @override_settings(API_RESPONSE_CACHE=None)
+    def test_patient_detail_conditional_get(self):
+        tenant = Tenant.objects.create(name="ClinicEtag", type="clinic", allow_partial_patients=True, patient_visible_fields=["first_name", "email"])
+        patient = Patient.objects.create(tenant=tenant, first_name="Same", email="etag@example.com")
+        user = User.objects.create_user(username="etaguser", password="etagpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("etaguser", "etagpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-detail", args=[patient.pk])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn("Last-Modified", response)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        # Another representation of the same row has another ETag.
+        self.assertNotEqual(self.client.get(url + "?expand=records")["ETag"], etag)
+        patient.first_name = "Changed"
+        patient.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(API_RESPONSE_CACHE='api')
+    def test_patient_list_conditional_get(self):
+        tenant = Tenant.objects.create(name="ClinicListEtag", type="clinic", allow_partial_patients=True, patient_visible_fields=["email"])
+        patients = [Patient.objects.create(tenant=tenant, email=f"listetag{i}@example.com") for i in range(3)]
+        user = User.objects.create_user(username="listetag", password="listetagpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("listetag", "listetagpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("patient-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+        # Served from the response cache: no queries at all.
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.settings(API_RESPONSE_CACHE=None, API_FAST_LIST_SERIALIZATION=True):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        patients[1].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+    @override_settings(API_SYNC_SETTLE_SECONDS=0)
+    def test_sync_patients_reports_deletions(self):
+        tenant = Tenant.objects.create(name="MobilePatients", type="mobile_app", allow_partial_patients=True, patient_visible_fields=["email"])
+        other = Tenant.objects.create(name="MobileOther", type="mobile_app", allow_partial_patients=True, patient_visible_fields=["email"])
+        kept = Patient.objects.create(tenant=tenant, email="kept@example.com")
+        gone = Patient.objects.create(tenant=tenant, email="gone@example.com")
+        Patient.objects.create(tenant=other, email="othersync@example.com").delete()
+        user = User.objects.create_user(username="syncuser", password="syncpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("syncuser", "syncpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("patient-sync"))
+        self.assertEqual(response.data["created"], [{"email": "kept@example.com"}, {"email": "gone@example.com"}])
+        self.assertEqual(response.data["deleted"], [])
+        gone_id = gone.pk
+        gone.delete()
+        response = self.client.get(reverse("patient-sync"), {"token": response.data["next_token"]})
+        self.assertEqual(response.data["created"] + response.data["updated"], [])
+        self.assertEqual(response.data["deleted"], [gone_id])
+        self.assertTrue(Patient.objects.filter(pk=kept.pk).exists())
+
+    @override_settings(API_SYNC_SETTLE_SECONDS=0)
+    def test_sync_reports_patients_moved_to_another_tenant_as_deleted(self):
+        tenant = Tenant.objects.create(name="MobileFrom", type="mobile_app", patient_visible_fields=["email"], patient_records_type=Tenant.RIGID)
+        other = Tenant.objects.create(name="MobileTo", type="mobile_app", patient_visible_fields=["email"], patient_records_type=Tenant.RIGID)
+        patient = Patient.objects.create(tenant=tenant, email="moving@example.com")
+        record = Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        user = User.objects.create_user(username="movesync", password="syncpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("movesync", "syncpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        patients_token = self.client.get(reverse("patient-sync")).data["next_token"]
+        records_token = self.client.get(reverse("record-sync")).data["next_token"]
+
+        patient = Patient.objects.get(pk=patient.pk)
+        patient.tenant = other
+        patient.save()
+        response = self.client.get(reverse("patient-sync"), {"token": patients_token})
+        self.assertEqual(response.data["deleted"], [patient.pk])
+        response = self.client.get(reverse("record-sync"), {"token": records_token})
+        self.assertEqual(response.data["deleted"], [record.pk])
+
+
+class TestPatientSerializerPlans(SimpleTestCase):
+    def setUp(self):
+        self.tenant = Tenant(pk=1, patient_visible_fields=["first_name", "last_name", "email", "ssn"], ssn_hippa_mandatory=False)
+        self.context = {"request": SimpleNamespace(tenant=self.tenant)}
+        self.patients = [
+            Patient(pk=i, tenant_id=1, first_name="Ann", last_name="Lee", ssn="123-45-6789", email=f"{i}@example.com")
+            for i in range(50)
+        ]
+
+    def test_plan_is_reused_and_rebuilt_on_tenant_change(self):
+        plan = patient_read_serializer_class(self.tenant)
+        self.assertIs(patient_read_serializer_class(self.tenant), plan)
+        self.assertEqual(list(plan().fields), ["ssn", "first_name", "last_name", "email"])
+        self.tenant.ssn_hippa_mandatory = True
+        self.assertEqual(list(patient_read_serializer_class(self.tenant)().fields), ["first_name", "last_name", "email"])
+
+    def test_expanded_class_is_kept_per_tenant(self):
+        expanded = expanded_patient_serializer_class(self.tenant, patient_read_serializer_class(self.tenant), RecordSerializer)
+        self.assertIs(expanded_patient_serializer_class(self.tenant, patient_read_serializer_class(self.tenant), RecordSerializer), expanded)
+        self.assertIn("records", expanded().fields)
+        # A tenant settings change replaces the tenant's entry.
+        self.tenant.ssn_hippa_mandatory = True
+        rebuilt = expanded_patient_serializer_class(self.tenant, patient_read_serializer_class(self.tenant), FlexibleRecordSerializer)
+        self.assertIsNot(rebuilt, expanded)
+        self.assertIs(_expanded_patient_classes[self.tenant.pk][1], rebuilt)
+
+    def test_list_serialization_matches_without_per_row_pruning(self):
+        for hipaa_mandatory in (False, True):
+            self.tenant.ssn_hippa_mandatory = hipaa_mandatory
+            expected = PatientSerializer(
+                self.patients, many=True, fields=self.tenant.patient_visible_fields, context=self.context
+            ).data
+            serializer_class = patient_read_serializer_class(self.tenant)
+            with mock.patch.object(
+                PatientSerializer, "to_representation", autospec=True, side_effect=PatientSerializer.to_representation
+            ) as prune:
+                data = serializer_class(self.patients, many=True, context=self.context).data
+            self.assertEqual(data, expected)
+            self.assertEqual(prune.call_count, 0)
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_tenant(apps, schema_editor):
+    Patient = apps.get_model('patients', 'Patient')
+    tenant_of_patient = Subquery(Patient.objects.filter(pk=OuterRef('patient_id')).values('tenant_id')[:1])
+    for model_name in ('Record', 'FlexibleRecord'):
+        apps.get_model('records', model_name).objects.update(tenant_id=tenant_of_patient)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_patient_patient_tenant_id_idx'),
+        ('records', '0002_remove_record_data_remove_record_record_type_and_more'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flexiblerecord',
+            name='tenant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tenant.tenant'),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='tenant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tenant.tenant'),
+        ),
+        migrations.RunPython(backfill_tenant, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flexiblerecord',
+            index=models.Index(fields=['patient', 'created_at'], name='flexiblerecord_pat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flexiblerecord',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='flexiblerecord_tnt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['patient', 'created_at'], name='record_pat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='record_tnt_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+def create_data_gin_index(apps, schema_editor):
+    # GIN is PostgreSQL only; other backends filter `data` without an index.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS flexiblerecord_data_gin '
+            'ON records_flexiblerecord USING gin (data)'
+        )
+
+
+def drop_data_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS flexiblerecord_data_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_patient_patient_tenant_id_idx'),
+        ('records', '0003_record_tenant_and_indexes'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flexiblerecord',
+            index=models.Index(fields=['tenant', 'record_type', 'created_at', 'id'], name='flexrecord_tnt_type_idx'),
+        ),
+        migrations.RunPython(create_data_gin_index, drop_data_gin_index),
+    ]
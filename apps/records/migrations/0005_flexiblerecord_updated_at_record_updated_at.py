@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0004_flexiblerecord_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flexiblerecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0006_patient_created_at_and_more'),
+        ('records', '0005_flexiblerecord_updated_at_record_updated_at'),
+        ('tenant', '0005_tenant_ssn_hippa_mandatory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flexiblerecord',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='flexiblerecord_tnt_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['tenant', 'updated_at', 'id'], name='record_tnt_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def resync_tenant(apps, schema_editor):
+    # Records saved raw (loaddata) before the pre_save receiver have no tenant,
+    # and records of patients that changed tenant kept the old one.
+    Patient = apps.get_model('patients', 'Patient')
+    tenant_of_patient = Subquery(Patient.objects.filter(pk=OuterRef('patient_id')).values('tenant_id')[:1])
+    for model_name in ('Record', 'FlexibleRecord'):
+        apps.get_model('records', model_name).objects.update(tenant_id=tenant_of_patient)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0006_flexiblerecord_flexiblerecord_tnt_updated_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(resync_tenant, migrations.RunPython.noop),
+    ]
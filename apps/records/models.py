@@ -1,14 +1,61 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
 from apps.patients.models import Patient
+from apps.tenant.models import Tenant, TenantScopedQuerySet
 
 from django.db import models
 
+# Sent with the queryset of records about to be deleted by Record.delete()
+# or a queryset delete, inside the delete's transaction. Unlike pre_delete it
+# leaves Django's fast delete on for records: a patient or tenant delete
+# removes them with one DELETE, and receivers handle them on the parent.
+records_deleting = Signal()
+
+
+class RecordQuerySet(TenantScopedQuerySet):
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            records_deleting.send(sender=self.model, queryset=self)
+            return super().delete()
+
+
 class BaseRecord(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    # Copy of patient.tenant so tenant listings don't need to join patients,
+    # kept in sync by the receivers at the end of this module.
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecordQuerySet.as_manager()
 
     class Meta:
         abstract = True
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='%(class)s_pat_created_idx'),
+            models.Index(fields=['tenant', 'created_at', 'id'], name='%(class)s_tnt_created_idx'),
+            models.Index(fields=['tenant', 'updated_at', 'id'], name='%(class)s_tnt_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The tenant as loaded: a record reassigned to another tenant's
+        # patient leaves a tombstone in this one (apps.api.sync).
+        instance._loaded_tenant_id = instance.__dict__.get('tenant_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_tenant_id = self.tenant_id
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            records_deleting.send(sender=type(self), queryset=type(self).objects.using(using).filter(pk=self.pk))
+            return super().delete(using, keep_parents)
 
 class Record(BaseRecord):
     diagnosis = models.TextField()
@@ -22,7 +69,47 @@ class Record(BaseRecord):
 
 class FlexibleRecord(BaseRecord):
     record_type = models.CharField(max_length=50,)
+    # On PostgreSQL `data` also has a GIN index (flexiblerecord_data_gin,
+    # migration 0004) for the containment filters of /api/records/.
     data = models.JSONField(default=dict)
 
+    class Meta(BaseRecord.Meta):
+        indexes = BaseRecord.Meta.indexes + [
+            models.Index(fields=['tenant', 'record_type', 'created_at', 'id'], name='flexrecord_tnt_type_idx'),
+        ]
+
     def __str__(self):
         return f"FlexibleRecord({self.patient} - {self.record_type})"
+
+
+@receiver(pre_save, sender=Record)
+@receiver(pre_save, sender=FlexibleRecord)
+def _copy_patient_tenant(sender, instance, raw, **kwargs):
+    """Sets the record's tenant from its patient, also for loaddata's raw saves."""
+    if instance.patient_id is None:
+        return
+    try:
+        instance.tenant_id = instance.patient.tenant_id
+    except Patient.DoesNotExist:
+        # A fixture may list the patient after its records.
+        if not raw:
+            raise
+
+
+UNKNOWN = object()
+
+
+@receiver(post_save, sender=Patient)
+def _move_records_with_patient(sender, instance, created, raw, **kwargs):
+    """
+    Moves the patient's records to its new tenant. Their updated_at changes
+    too, so the new tenant's delta sync picks them up. Raw saves always sync,
+    for fixture records listed before their patient.
+    """
+    # Patients not loaded from the database may have changed tenant too.
+    if not raw and (created or getattr(instance, '_loaded_tenant_id', UNKNOWN) == instance.tenant_id):
+        return
+    for model in (Record, FlexibleRecord):
+        model.objects.filter(patient=instance).exclude(tenant_id=instance.tenant_id).update(
+            tenant_id=instance.tenant_id, updated_at=timezone.now()
+        )
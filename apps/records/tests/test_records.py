@@ -1,13 +1,18 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from unittest import mock
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
+from apps.api.testing import EndpointCostMixin
 from apps.patients.models import Patient
 from apps.tenant.models import Tenant
 from apps.user.models import UserProfile
 from apps.records.models import Record, FlexibleRecord
 from django.contrib.auth.models import User
 
-class TestPatientSSNScenarios(TestCase):
+class TestPatientSSNScenarios(EndpointCostMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
 
@@ -164,3 +169,329 @@ class TestPatientSSNScenarios(TestCase):
         self.assertEqual(record.doctor_name, "Dr. Smith")
 
 
+
+    def test_list_records_keyset_pagination(self):
+        tenant = Tenant.objects.create(
+            name="HospitalPages",
+            type="hospital",
+            patient_visible_fields=["all"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="pagesuser", password="pagespass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="pages@example.com")
+        records = [
+            Record.objects.create(patient=patient, diagnosis=f"Diagnosis {i}", treatment="Rest", doctor_name="Dr. Smith")
+            for i in range(5)
+        ]
+        # Ties on created_at must be broken by id.
+        Record.objects.filter(pk__in=[r.pk for r in records[1:4]]).update(created_at=records[1].created_at)
+        token = self.get_token("pagesuser", "pagespass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        seen = []
+        url = reverse("record-list") + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(r["id"] for r in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, [r.pk for r in records])
+
+        response = self.client.get(reverse("record-list") + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_records_page_size_is_capped(self):
+        tenant = Tenant.objects.create(
+            name="HospitalCap",
+            type="hospital",
+            patient_visible_fields=["all"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="capuser", password="cappass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="cap@example.com")
+        for i in range(3):
+            FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"i": i})
+        token = self.get_token("capuser", "cappass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse("record-list") + "?page_size=100")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_export_flexible_records_ndjson(self):
+        tenant = Tenant.objects.create(
+            name="ClinicExport",
+            type="clinic",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="exportuser", password="exportpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, first_name="Hidden", email="export@example.com")
+        for i in range(3):
+            FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"value": i})
+        other_tenant = Tenant.objects.create(name="Other", type="clinic", patient_records_type=Tenant.FLEXIBLE)
+        other_patient = Patient.objects.create(tenant=other_tenant, email="other@example.com")
+        FlexibleRecord.objects.create(patient=other_patient, record_type="Lab", data={})
+        token = self.get_token("exportuser", "exportpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get("/api/records/export/ndjson/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line["data"]["value"] for line in lines], [0, 1, 2])
+        self.assertEqual(lines[0]["patient"], patient.id)
+        self.assertEqual(lines[0]["patient_details"], {"email": "export@example.com"})
+
+    def test_export_rigid_records_csv(self):
+        tenant = Tenant.objects.create(
+            name="HospitalExport",
+            type="hospital",
+            patient_visible_fields=["first_name", "ssn"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="csvuser", password="csvpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, first_name="Jane", ssn="123-45-6789", email="csv@example.com")
+        Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        token = self.get_token("csvuser", "csvpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get("/api/records/export/csv/")
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["diagnosis"], "Flu")
+        self.assertEqual(rows[0]["patient_first_name"], "Jane")
+        self.assertEqual(rows[0]["patient_ssn"], "123-45-6789")
+        self.assertNotIn("patient_email", rows[0])
+
+    def test_bulk_ingest_flexible_records(self):
+        tenant = Tenant.objects.create(
+            name="ClinicBulk",
+            type="clinic",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="bulkrecords", password="bulkpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        first = Patient.objects.create(tenant=tenant, email="first@example.com")
+        second = Patient.objects.create(tenant=tenant, email="second@example.com")
+        other_tenant = Tenant.objects.create(name="OtherBulk", type="clinic", patient_records_type=Tenant.FLEXIBLE)
+        foreign = Patient.objects.create(tenant=other_tenant, email="foreign@example.com")
+        token = self.get_token("bulkrecords", "bulkpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        items = [
+            {"patient": first.id, "record_type": "HeartRate", "data": {"bpm": 71}},
+            {"patient": second.id, "record_type": "HeartRate", "data": {"bpm": 88}},
+            {"patient": foreign.id, "record_type": "HeartRate", "data": {"bpm": 60}},
+            {"patient": first.id, "data": {"bpm": 65}},
+            {"record_type": "HeartRate", "data": {}},
+            {"patient": first.id, "record_type": "HeartRate", "data": {"bpm": 90}},
+        ]
+        self.client.post(reverse("record-bulk-create"), [], format="json")
+        # One patient lookup and one INSERT (plus the test savepoint pair).
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("record-bulk-create"), items, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["data"]["bpm"] for r in response.data["created"]], [71, 88, 90])
+        self.assertEqual([e["index"] for e in response.data["errors"]], [2, 3, 4])
+        self.assertIn("patient", response.data["errors"][0]["errors"])
+        self.assertIn("record_type", response.data["errors"][1]["errors"])
+        self.assertEqual(FlexibleRecord.objects.filter(patient__tenant=tenant).count(), 3)
+        self.assertFalse(FlexibleRecord.objects.filter(patient=foreign).exists())
+
+    def test_filter_flexible_records(self):
+        tenant = Tenant.objects.create(
+            name="ClinicFilters",
+            type="clinic",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="filteruser", password="filterpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="filters@example.com")
+        lab = FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"test": "glucose", "value": 98})
+        vitals = FlexibleRecord.objects.create(patient=patient, record_type="Vitals", data={"bpm": 71, "unit": "bpm"})
+        old = FlexibleRecord.objects.create(patient=patient, record_type="Vitals", data={"bpm": "71"})
+        FlexibleRecord.objects.filter(pk=old.pk).update(created_at="2020-01-01T00:00:00Z")
+        token = self.get_token("filteruser", "filterpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        def ids(query):
+            response = self.client.get(reverse("record-list") + query)
+            self.assertEqual(response.status_code, 200, response.data)
+            return {r["id"] for r in response.data["results"]}
+
+        self.assertEqual(ids("?record_type=Lab"), {lab.id})
+        self.assertEqual(ids("?data.test=glucose"), {lab.id})
+        self.assertEqual(ids("?data.bpm=71"), {vitals.id, old.id})
+        self.assertEqual(ids("?data.bpm=71&created_after=2021-01-01"), {vitals.id})
+        self.assertEqual(ids("?created_before=2021-01-01"), {old.id})
+        self.assertEqual(ids('?data_contains={"unit": "bpm"}'), {vitals.id})
+        self.assertEqual(ids("?data_has_key=test"), {lab.id})
+        self.assertEqual(self.client.get(reverse("record-list") + "?created_after=yesterday").status_code, 400)
+        for value in ("2020-13-01", "2020-01-01T25:00:00"):
+            self.assertEqual(self.client.get(reverse("record-list") + f"?created_after={value}").status_code, 400)
+
+    def test_flexible_filters_rejected_for_rigid_tenant(self):
+        tenant = Tenant.objects.create(
+            name="HospitalFilters",
+            type="hospital",
+            patient_visible_fields=["all"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="rigidfilter", password="rigidpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        token = self.get_token("rigidfilter", "rigidpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("record-list") + "?data.bpm=71")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("data.bpm", response.data)
+
+    @override_settings(API_RESPONSE_CACHE='api')
+    def test_record_list_cache_is_invalidated_by_bulk_ingestion(self):
+        tenant = Tenant.objects.create(
+            name="ClinicListCache",
+            type="clinic",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="listcache", password="listpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="listcache@example.com")
+        FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={})
+        token = self.get_token("listcache", "listpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(len(self.client.get(reverse("record-list")).data["results"]), 1)
+        response = self.client.get(reverse("record-list"))
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.client.post(reverse("record-bulk-create"), [{"patient": patient.id, "record_type": "Lab", "data": {}}], format="json")
+        response = self.client.get(reverse("record-list"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    @override_settings(API_RESPONSE_CACHE=None)
+    def test_record_list_is_scoped_to_tenant(self):
+        tenant = Tenant.objects.create(
+            name="HospitalScoped",
+            type="hospital",
+            patient_visible_fields=["all"],
+            patient_records_type=Tenant.RIGID
+        )
+        other = Tenant.objects.create(
+            name="HospitalOther",
+            type="hospital",
+            patient_visible_fields=["all"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="scopedrecords", password="scopedpass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="scopedrecords@example.com")
+        foreign = Patient.objects.create(tenant=other, email="foreignrecords@example.com")
+        for i in range(2):
+            Record.objects.create(patient=patient, diagnosis=f"Own {i}", treatment="Rest", doctor_name="Dr. Smith")
+        for i in range(4):
+            Record.objects.create(patient=foreign, diagnosis=f"Foreign {i}", treatment="Rest", doctor_name="Dr. Smith")
+        token = self.get_token("scopedrecords", "scopedpass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get(reverse("record-list"))
+        with self.assertEndpointCost(queries=1, rows=2):
+            response = self.client.get(reverse("record-list"))
+        self.assertEqual([r["diagnosis"] for r in response.data["results"]], ["Own 0", "Own 1"])
+        response = self.client.post(reverse("record-list"), {
+            "patient": foreign.id, "diagnosis": "Flu", "treatment": "Rest", "doctor_name": "Dr. Smith"
+        }, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(API_RESPONSE_CACHE=None)
+    def test_record_list_not_modified_skips_serialization(self):
+        tenant = Tenant.objects.create(
+            name="MobileEtag",
+            type="mobile_app",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="mobileetag", password="mobilepass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="mobileetag@example.com")
+        record = Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        token = self.get_token("mobileetag", "mobilepass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        etag = self.client.get(reverse("record-list"))["ETag"]
+        with mock.patch("apps.api.views.RecordSerializer.to_representation", side_effect=AssertionError):
+            response = self.client.get(reverse("record-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        record.treatment = "Fluids"
+        record.save()
+        response = self.client.get(reverse("record-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["treatment"], "Fluids")
+
+    @override_settings(API_SYNC_SETTLE_SECONDS=0)
+    def test_sync_records_since_token(self):
+        tenant = Tenant.objects.create(
+            name="MobileSync",
+            type="mobile_app",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.FLEXIBLE
+        )
+        user = User.objects.create_user(username="mobilesync", password="mobilepass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="mobilesync@example.com")
+        records = [FlexibleRecord.objects.create(patient=patient, record_type="Lab", data={"i": i}) for i in range(3)]
+        token = self.get_token("mobilesync", "mobilepass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse("record-sync")
+
+        with self.settings(API_SYNC_PAGE_SIZE=2):
+            first = self.client.get(url).data
+            self.assertTrue(first["has_more"])
+            second = self.client.get(url, {"token": first["next_token"]}).data
+        self.assertFalse(second["has_more"])
+        self.assertEqual(
+            [r["id"] for r in first["created"] + second["created"]], [r.pk for r in records]
+        )
+        self.assertEqual(second["updated"], [])
+
+        records[0].data = {"i": 10}
+        records[0].save()
+        deleted_id = records[1].pk
+        records[1].delete()
+        added = FlexibleRecord.objects.create(patient=patient, record_type="Vitals", data={"bpm": 70})
+        with self.assertEndpointCost(queries=2):
+            response = self.client.get(url, {"token": second["next_token"]})
+        self.assertEqual([r["id"] for r in response.data["created"]], [added.pk])
+        self.assertEqual([r["data"] for r in response.data["updated"]], [{"i": 10}])
+        self.assertEqual(response.data["deleted"], [deleted_id])
+
+        response = self.client.get(url, {"token": response.data["next_token"]})
+        self.assertEqual((response.data["created"], response.data["updated"], response.data["deleted"]), ([], [], []))
+        self.assertEqual(self.client.get(url, {"token": "forged"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("patient-sync"), {"token": response.data["next_token"]}).status_code, 400)
+        # Past API_SYNC_TOKEN_MAX_AGE_DAYS its tombstones may be purged: full resync.
+        with self.settings(API_SYNC_TOKEN_MAX_AGE_DAYS=0):
+            response = self.client.get(url, {"token": response.data["next_token"]})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data["detail"].code, "full_resync")
+
+    def test_sync_holds_back_unsettled_changes(self):
+        tenant = Tenant.objects.create(
+            name="MobileSettle",
+            type="mobile_app",
+            patient_visible_fields=["email"],
+            patient_records_type=Tenant.RIGID
+        )
+        user = User.objects.create_user(username="mobilesettle", password="mobilepass")
+        UserProfile.objects.create(user=user, tenant=tenant)
+        patient = Patient.objects.create(tenant=tenant, email="mobilesettle@example.com")
+        Record.objects.create(patient=patient, diagnosis="Flu", treatment="Rest", doctor_name="Dr. Smith")
+        token = self.get_token("mobilesettle", "mobilepass")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse("record-sync"))
+        self.assertEqual(response.data["created"], [])
+        with self.settings(API_SYNC_SETTLE_SECONDS=0):
+            response = self.client.get(reverse("record-sync"), {"token": response.data["next_token"]})
+        self.assertEqual(len(response.data["created"]), 1)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class TenantConfig(AppConfig):
+    name = 'apps.tenant'
+
+    def ready(self):
+        from . import cache  # noqa: F401  (connects invalidation signals)
+        from . import checks  # noqa: F401  (registers the revocation cache check)
+        from . import tokens  # noqa: F401  (connects token revocation signals)
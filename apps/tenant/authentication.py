@@ -0,0 +1,171 @@
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.api.instrumentation import phase
+from .cache import principal_cache, tenant_cache
+from .models import Tenant
+from .tokens import TENANT_CLAIM, TenantTokenUser, ais_revoked, is_revoked, stateless_auth_enabled
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user, profile and tenant with one
+    query and keeps them in the per-process principal cache, so repeated
+    requests with the same token user cost no queries.
+
+    With JWT_STATELESS_AUTH, tokens carrying tenant claims skip the user
+    altogether (see apps.tenant.tokens) unless they were revoked.
+
+    ``aauthenticate`` is the version for async requests: stateless tokens of
+    a cached tenant are resolved on the event loop, everything else runs
+    ``get_user`` in a thread.
+    """
+
+    def authenticate(self, request):
+        with phase("auth"):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        with phase("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if stateless_auth_enabled() and TENANT_CLAIM in validated_token:
+            if not await ais_revoked(validated_token):
+                return await self.aget_token_user(validated_token)
+        return await sync_to_async(self.get_user)(validated_token)
+
+    def get_user(self, validated_token):
+        if stateless_auth_enabled() and TENANT_CLAIM in validated_token:
+            if not is_revoked(validated_token):
+                return self.get_token_user(validated_token)
+            user = self.get_stored_user(validated_token)
+            if getattr(getattr(user, "profile", None), "tenant_id", None) != validated_token[TENANT_CLAIM]:
+                raise AuthenticationFailed(_("Token tenant is no longer valid"), code="tenant_changed")
+            return user
+        return self.get_stored_user(validated_token)
+
+    def get_token_user(self, validated_token):
+        tenant_id = validated_token[TENANT_CLAIM]
+        tenant = tenant_cache.get(tenant_id)
+        if tenant is None:
+            tenant = Tenant.objects.filter(pk=tenant_id).first()
+            if tenant is None:
+                raise AuthenticationFailed(_("Tenant not found"), code="tenant_not_found")
+            tenant_cache.set(tenant_id, tenant)
+        return TenantTokenUser(validated_token, tenant)
+
+    async def aget_token_user(self, validated_token):
+        tenant_id = validated_token[TENANT_CLAIM]
+        tenant = tenant_cache.get(tenant_id)
+        if tenant is None:
+            tenant = await Tenant.objects.filter(pk=tenant_id).afirst()
+            if tenant is None:
+                raise AuthenticationFailed(_("Tenant not found"), code="tenant_not_found")
+            tenant_cache.set(tenant_id, tenant)
+        return TenantTokenUser(validated_token, tenant)
+
+    def get_stored_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = principal_cache.get(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related("profile__tenant").get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            principal_cache.set(user_id, user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+RESOLVED_ATTR = "_tenant_auth"
+
+
+def authenticate_request(request):
+    """
+    ``(user, validated token)`` for the request's JWT, None if it has none.
+    Raises AuthenticationFailed for invalid tokens.
+
+    The token is decoded once per request: the result, or the failure, is
+    kept on the HttpRequest (also when given the DRF Request wrapping it),
+    so the tenant middlewares, tenant_required and TenantJWTAuthentication
+    all share it.
+    """
+    request = getattr(request, "_request", request)
+    try:
+        result = getattr(request, RESOLVED_ATTR)
+    except AttributeError:
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except exceptions.AuthenticationFailed as e:
+            result = e
+        setattr(request, RESOLVED_ATTR, result)
+    if isinstance(result, exceptions.AuthenticationFailed):
+        raise result
+    return result
+
+
+async def aauthenticate_request(request):
+    """authenticate_request for async requests, sharing its memo."""
+    request = getattr(request, "_request", request)
+    try:
+        result = getattr(request, RESOLVED_ATTR)
+    except AttributeError:
+        try:
+            result = await CachedJWTAuthentication().aauthenticate(request)
+        except exceptions.AuthenticationFailed as e:
+            result = e
+        setattr(request, RESOLVED_ATTR, result)
+    if isinstance(result, exceptions.AuthenticationFailed):
+        raise result
+    return result
+
+
+def principal_tenant(result):
+    if result is None:
+        return None, None
+    user = result[0]
+    return user, getattr(getattr(user, "profile", None), "tenant", None)
+
+
+def resolve_tenant(request):
+    """``(user, tenant)`` for the request's JWT; either may be None."""
+    return principal_tenant(authenticate_request(request))
+
+
+async def aresolve_tenant(request):
+    return principal_tenant(await aauthenticate_request(request))
+
+
+class TenantJWTAuthentication(CachedJWTAuthentication):
+    """DRF authentication class reusing the request's resolved token."""
+
+    def authenticate(self, request):
+        return authenticate_request(request)
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.user.models import UserProfile
+from .models import Tenant
+
+
+class TTLCache:
+    """Per-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PrincipalCache(TTLCache):
+    """
+    Per-process LRU cache of authenticated users keyed by the token user_id.
+
+    Each cached user is loaded with ``select_related('profile__tenant')`` so
+    ``user.profile.tenant`` costs no queries. Entries expire after ``ttl``
+    seconds and are dropped when the User, its UserProfile or its Tenant is
+    saved or deleted in this process; other processes see the change once
+    their entry expires.
+    """
+
+    def invalidate_user(self, user_id):
+        self.invalidate(user_id)
+
+    def invalidate_tenant(self, tenant_id):
+        with self._lock:
+            stale = [
+                user_id for user_id, (_, user) in self._entries.items()
+                if getattr(getattr(user, 'profile', None), 'tenant_id', None) == tenant_id
+            ]
+            for user_id in stale:
+                del self._entries[user_id]
+
+
+principal_cache = PrincipalCache(
+    ttl=getattr(settings, 'PRINCIPAL_CACHE_TTL', 60),
+    max_entries=getattr(settings, 'PRINCIPAL_CACHE_MAX_ENTRIES', 10000),
+)
+
+# Tenants by pk for stateless token users (apps.tenant.tokens).
+tenant_cache = TTLCache(
+    ttl=getattr(settings, 'PRINCIPAL_CACHE_TTL', 60),
+    max_entries=getattr(settings, 'PRINCIPAL_CACHE_MAX_ENTRIES', 10000),
+)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _invalidate_user(sender, instance, **kwargs):
+    principal_cache.invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def _invalidate_profile(sender, instance, **kwargs):
+    principal_cache.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def _invalidate_tenant(sender, instance, **kwargs):
+    principal_cache.invalidate_tenant(instance.pk)
+    tenant_cache.invalidate(instance.pk)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.checks import Error, Tags, register
+
+from .tokens import stateless_auth_enabled
+
+# Backends that are per process, store nothing, or drop entries when full:
+# a lost revocation marker would let revoked tokens through.
+UNSAFE_REVOCATION_BACKENDS = (LocMemCache, DummyCache, FileBasedCache, DatabaseCache, BaseMemcachedCache)
+
+
+@register(Tags.security, Tags.caches)
+def check_revocation_cache(app_configs, **kwargs):
+    """JWT_STATELESS_AUTH needs a shared AUTH_REVOCATION_CACHE that does not cull."""
+    if not stateless_auth_enabled():
+        return []
+    alias = getattr(settings, 'AUTH_REVOCATION_CACHE', 'default')
+    try:
+        cache = caches[alias]
+    except InvalidCacheBackendError:
+        return [Error(f"AUTH_REVOCATION_CACHE '{alias}' is not in CACHES.", id='tenant.E001')]
+    if isinstance(cache, UNSAFE_REVOCATION_BACKENDS):
+        return [Error(
+            f"JWT_STATELESS_AUTH needs AUTH_REVOCATION_CACHE '{alias}' to be shared by every "
+            f"process and never cull entries; {type(cache).__name__} is not.",
+            hint="Use a Redis cache for AUTH_REVOCATION_CACHE or set JWT_STATELESS_AUTH = False.",
+            id='tenant.E002',
+        )]
+    return []
@@ -3,7 +3,7 @@
 from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import resolve_tenant
 from django.contrib.auth.models import AnonymousUser
 
 
@@ -14,15 +14,11 @@ def tenant_required(view_func):
     """
     @wraps(view_func)
     def _wrapped_view(view, request, *args, **kwargs):
-        user = None
         try:
-            # Authenticate with JWT
-            jwt_auth = JWTAuthentication()
-            auth_result = jwt_auth.authenticate(request)
-            if auth_result:
-                user, _ = auth_result
+            # Authenticate with JWT (decoded once per request, see resolve_tenant)
+            user, tenant = resolve_tenant(request)
         except Exception:
-            user = None
+            user, tenant = None, None
 
         request.user = user or AnonymousUser()
 
@@ -33,9 +29,6 @@ def tenant_required(view_func):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        # Extract tenant
-        tenant = getattr(getattr(user, "profile", None), "tenant", None)
-
         if not tenant:
             return Response(
                 {"detail": "Malformed token or tenant not assigned."},
@@ -1,22 +1,14 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Tenant
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import resolve_tenant
 from django.contrib.auth.models import AnonymousUser
 
 class TenantMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        user = None
         try:
-            user_auth = JWTAuthentication()
-            user_auth_result = user_auth.authenticate(request)
-            if user_auth_result:
-                user, _ = user_auth_result
+            user, tenant = resolve_tenant(request)
         except Exception:
-            user = None
+            user, tenant = None, None
         request.user = user or AnonymousUser()
 
         # Obtener tenant solo desde el perfil de usuario autenticado
-        tenant = None
-        if user and hasattr(user, 'profile') and hasattr(user.profile, 'tenant'):
-            tenant = user.profile.tenant
-        request.tenant = tenant
\ No newline at end of file
+        request.tenant = tenant
@@ -1,5 +1,16 @@
 from django.db import models
 
+
+class TenantScopedQuerySet(models.QuerySet):
+    """QuerySet of models that have a ``tenant`` foreign key."""
+
+    def for_tenant(self, tenant):
+        """Rows of ``tenant`` (instance or pk); no rows at all without a tenant."""
+        if tenant is None:
+            return self.none()
+        return self.filter(tenant=tenant)
+
+
 class Tenant(models.Model):
     RIGID = "rigid"
     FLEXIBLE = "flexible"
@@ -0,0 +1,139 @@
+"""
+Tenant claims in JWTs and the stateless token users built from them.
+
+TenantTokenObtainPairSerializer (SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER'])
+adds to every token:
+- the user's ``tenant_id`` and the tenant's ``tenant_premium`` flag;
+- ``username``, ``is_staff`` and ``is_superuser``;
+- ``auth_time``, the login time, which refreshed access tokens keep.
+TenantTokenRefreshSerializer (SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER']) reads
+the profile again, so refreshed access tokens carry the current tenant.
+
+With JWT_STATELESS_AUTH, CachedJWTAuthentication trusts those claims: the
+request user is a TenantTokenUser whose ``profile.tenant`` comes from the
+per-process tenant cache, so authenticating costs a signature check and no
+queries. The Tenant itself stays authoritative for everything the API
+decides (fields, records type, premium); the tenant claims let clients and
+other services read them without calling the API.
+
+Saving or deleting a User or UserProfile revokes the tokens issued before
+it, by storing the time in the AUTH_REVOCATION_CACHE cache. Those tokens
+are then checked against the database again: the user must still exist,
+be active, have the same password (CHECK_REVOKE_TOKEN) and belong to the
+token's tenant. The marker is only seen by processes sharing that cache,
+and a culled marker lets revoked tokens through: JWT_STATELESS_AUTH is off
+by default, and apps.tenant.checks refuses it unless AUTH_REVOCATION_CACHE
+is a shared backend that does not cull.
+"""
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.user.models import UserProfile
+
+TENANT_CLAIM = 'tenant_id'
+AUTH_TIME_CLAIM = 'auth_time'
+TENANT_CLAIMS = (TENANT_CLAIM, 'tenant_premium')
+
+
+def set_tenant_claims(token, user_id):
+    """Sets the tenant claims of ``token`` from the user's current profile."""
+    profile = UserProfile.objects.select_related('tenant').filter(user_id=user_id).first()
+    if profile is None:
+        for claim in TENANT_CLAIMS:
+            token.payload.pop(claim, None)
+        return
+    token[TENANT_CLAIM] = profile.tenant_id
+    token['tenant_premium'] = profile.tenant.premium
+
+
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.get_username()
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token[AUTH_TIME_CLAIM] = time.time()
+        set_tenant_claims(token, user.pk)
+        return token
+
+
+class TenantRefreshToken(RefreshToken):
+    """RefreshToken whose access tokens get the user's current tenant claims."""
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        set_tenant_claims(access, self.payload.get(api_settings.USER_ID_CLAIM))
+        return access
+
+
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = TenantRefreshToken
+
+
+class TenantTokenUser(TokenUser):
+    """TokenUser with ``profile.tenant`` set, like a User loaded with its profile."""
+
+    def __init__(self, token, tenant):
+        super().__init__(token)
+        self.profile = SimpleNamespace(tenant=tenant, tenant_id=tenant.pk)
+
+
+def stateless_auth_enabled():
+    return getattr(settings, 'JWT_STATELESS_AUTH', False)
+
+
+def revocation_cache():
+    return caches[getattr(settings, 'AUTH_REVOCATION_CACHE', 'default')]
+
+
+def revocation_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def revoke_tokens(user_id):
+    """Sends tokens of ``user_id`` issued until now back to the database checks."""
+    timeout = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    revocation_cache().set(revocation_key(user_id), time.time(), timeout)
+
+
+def is_revoked(token):
+    revoked_at = revocation_cache().get(revocation_key(token[api_settings.USER_ID_CLAIM]))
+    return revoked_at is not None and token.get(AUTH_TIME_CLAIM, 0) <= revoked_at
+
+
+async def ais_revoked(token):
+    cache = revocation_cache()
+    key = revocation_key(token[api_settings.USER_ID_CLAIM])
+    # LocMemCache is in-process and never blocks; Django runs the async
+    # methods of every backend in a thread.
+    revoked_at = cache.get(key) if isinstance(cache, LocMemCache) else await cache.aget(key)
+    return revoked_at is not None and token.get(AUTH_TIME_CLAIM, 0) <= revoked_at
+
+
+@receiver(post_save, sender=User)
+def _revoke_on_user_save(sender, instance, created, **kwargs):
+    if not created:
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def _revoke_on_user_delete(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def _revoke_on_profile_change(sender, instance, **kwargs):
+    revoke_tokens(instance.user_id)
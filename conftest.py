@@ -0,0 +1,2 @@
+# Query budget and N+1 checks for the API tests (see apps.api.pytest_plugin).
+pytest_plugins = ['apps.api.pytest_plugin']
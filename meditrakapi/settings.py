@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.api.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -137,12 +138,81 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework configuration
 REST_FRAMEWORK = {
+    # Reuses the token DRFTenantMiddleware already decoded for the request.
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.tenant.authentication.TenantJWTAuthentication',
         )
 }
 
+# Keyset pagination for list endpoints (apps.api.pagination). Clients may
+# ask for ?page_size= up to API_MAX_PAGE_SIZE.
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Serve list endpoints from .values() rows instead of DRF serializer
+# instances (apps.api.fastpath). Same output, less CPU per row.
+API_FAST_LIST_SERIALIZATION = False
+
+# /api/patients/?expand=records embeds the latest API_EXPANDED_RECORDS_LIMIT
+# records of each patient.
+API_EXPANDED_RECORDS_LIMIT = 20
+
+# /api/patients/sync/ and /api/records/sync/: rows per page, and how long a
+# change waits before being served so in-flight transactions can commit.
+API_SYNC_PAGE_SIZE = 500
+API_SYNC_SETTLE_SECONDS = 5
+# Sync tokens last this long (then a 410 asks for a full sync); run
+# `manage.py purge_tombstones` daily to drop the tombstones they needed.
+API_SYNC_TOKEN_MAX_AGE_DAYS = 30
+
+# Bulk endpoints (/api/patients/bulk/, ...): max items per request and rows
+# per INSERT.
+API_BULK_MAX_ITEMS = 1000
+API_BULK_BATCH_SIZE = 500
+
+# Serve patient and record list, retrieve and create with async views
+# (apps.api.async_views). Only worth it under ASGI
+# (uvicorn meditrakapi.asgi:application); read when the URLconf loads.
+API_ASYNC_VIEWS = False
+
+# Caches. 'api' holds cached list/retrieve responses (apps.api.cache) when
+# API_RESPONSE_CACHE = 'api'; off by default. Writes invalidate the cache of
+# the process that made them only, so LocMemCache is only correct with a
+# single process: with several workers (gunicorn -w N, uvicorn --workers N)
+# point 'api' at a shared backend such as
+# django.core.cache.backends.redis.RedisCache first. LocMemCache evicts least
+# recently used entries past MAX_ENTRIES.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+API_RESPONSE_CACHE = None
+
+# Per-request phase timings as a Server-Timing header, aggregated into the
+# Prometheus histograms of /api/metrics/ (apps.api.instrumentation), which
+# only answers requests from API_METRICS_ALLOWED_IPS.
+API_INSTRUMENTATION = True
+API_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Tenants with their own series in the per-tenant latency histogram, per
+# process; later tenants share tenant="other". 0 turns it off, as each
+# series costs Prometheus storage.
+API_METRICS_TENANT_SERIES = 0
+
+# Per-process cache of token users with their profile and tenant
+# (apps.tenant.cache). Entries are dropped on User/UserProfile/Tenant writes.
+PRINCIPAL_CACHE_TTL = 60
+PRINCIPAL_CACHE_MAX_ENTRIES = 10000
+
 SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.tenant.tokens.TenantTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'apps.tenant.tokens.TenantTokenRefreshSerializer',
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
@@ -153,3 +223,36 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 }
+
+# Authenticate tokens from their tenant claims and the cached Tenant, with
+# no user query (apps.tenant.tokens). User/profile changes revoke older
+# tokens through the AUTH_REVOCATION_CACHE alias, so enabling it requires
+# that alias to be a cache shared by every process that does not cull
+# entries, e.g. Redis (checked by apps.tenant.checks).
+JWT_STATELESS_AUTH = False
+AUTH_REVOCATION_CACHE = 'default'
+
+# Audit log writer (apps.api.audit). Events from premium tenants are queued
+# and written with bulk_create off the request thread.
+# BACKPRESSURE: 'block' | 'drop' | 'sync' when the queue is full.
+AUDIT_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'QUEUE_SIZE': 10000,
+    'BACKPRESSURE': 'block',
+    'BLOCK_TIMEOUT': 0.5,
+    # Where batches go (apps.api.sinks). To keep audit writes off the
+    # database use 'apps.api.sinks.JSONLFileSink' with
+    # {'directory': '/var/lib/meditrak/audit', 'max_bytes': 64 * 1024 * 1024}
+    # and import the rotated files with `manage.py load_audit_files`.
+    'SINK': 'apps.api.sinks.DatabaseSink',
+    'SINK_OPTIONS': {},
+}
+
+# Monthly audit log partitions on PostgreSQL (apps.api.partitions), kept by
+# `manage.py audit_partitions` run daily: months created ahead of the current
+# one, and months kept before partitions are dropped. Dropping compliance
+# data is opt-in: None keeps them all.
+AUDIT_LOG_PARTITIONS_AHEAD = 3
+AUDIT_LOG_RETENTION_MONTHS = None